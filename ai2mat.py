@@ -0,0 +1,86 @@
+# %%
+# pylint: disable=E1101
+import argparse
+import os
+import sys
+import time
+
+import pipeline
+
+
+# %%
+def main(argv=None):
+    """
+    ------------------------------------------------
+    The headless entry point, generates the materials of a manifest into a library.
+
+    Usage:
+    ------------------------------------------------
+    python ai2mat.py manifest.jsonl --library D:/materials --previews D:/previews
+    """
+    parser = argparse.ArgumentParser(
+        prog="ai2mat",
+        description="Generate the materials of a CSV or JSONL manifest without the interface.",
+    )
+    parser.add_argument("manifest", help="CSV or JSONL file, one material per row")
+    parser.add_argument("--library", required=True, help="material library folder")
+    parser.add_argument("--previews", help="folder for the preview renders")
+    parser.add_argument(
+        "--batch-size", type=int, default=16, help="materials per library write"
+    )
+    parser.add_argument(
+        "--packed", action="store_true", help="pack metal/rough/disp into one image"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="threads synthesizing a material (default: all cores)",
+    )
+    parser.add_argument(
+        "--render-processes",
+        type=int,
+        default=2,
+        help="blender processes rendering the previews, 0 renders in this process",
+    )
+    parser.add_argument(
+        "--queue-size", type=int, default=2, help="items waiting between two stages"
+    )
+    parser.add_argument(
+        "--sequential", action="store_true", help="run the stages one after another"
+    )
+    args = parser.parse_args(argv)
+
+    items = pipeline.read_manifest(args.manifest)
+    start = time.perf_counter()
+    if args.sequential:
+        finished = pipeline.run(
+            items,
+            args.library,
+            previews=args.previews,
+            batch_size=args.batch_size,
+            packed=args.packed,
+            workers=args.workers,
+        )
+    else:
+        finished = pipeline.run_pipelined(
+            items,
+            args.library,
+            previews=args.previews,
+            batch_size=args.batch_size,
+            packed=args.packed,
+            workers=args.workers,
+            render_processes=args.render_processes,
+            queue_size=args.queue_size,
+        )
+    seconds = time.perf_counter() - start
+    print(
+        "%d materials in %.1f s (%.2f s/material)"
+        % (len(finished), seconds, seconds / max(1, len(finished)))
+    )
+    return 0
+
+
+# %%
+if __name__ == "__main__":
+    sys.exit(main())
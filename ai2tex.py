@@ -1,26 +1,333 @@
 # %%
 # pylint: disable=E1101
-import diffusers
-import torch
-from diffusers import StableDiffusionInpaintPipeline, StableDiffusionPipeline
-
-diffusers.logging.set_verbosity_info()
+import contextlib
+import functools
+import gc
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
 
 import cv2
 import numpy as np
 from PIL import Image, ImageDraw
 
-pipe_create = StableDiffusionPipeline.from_pretrained(
-    "stabilityai/stable-diffusion-2-1-base", revision="fp16", torch_dtype=torch.float16
-)
-pipe_create.to("cuda")
-pipe_create.enable_model_cpu_offload()
+# %%
+# Pipeline registry
+# The diffusion pipelines are only constructed when they are first used, so importing
+# this module (and launching the interface or a batch script) does not load any weights.
+MODEL_CREATE = "stabilityai/stable-diffusion-2-1-base"
+MODEL_INPAINT = "stabilityai/stable-diffusion-2-inpainting"
+
+# seconds an unused pipeline is kept in memory before it is evicted, None keeps it forever
+PIPELINE_KEEP_ALIVE = None
+
+_pipeline_factories = {}
+_pipelines = {}
+_pipeline_lock = threading.RLock()
+# guards the padding swap of _circular_padding, apart from the registry lock
+_padding_lock = threading.Lock()
+# pending timer that evicts the idle pipelines, see _schedule_eviction
+_eviction = {"timer": None}
+
+
+def _load_create_pipeline():
+    import diffusers
+    import torch
+    from diffusers import StableDiffusionPipeline
+
+    diffusers.logging.set_verbosity_info()
+
+    pipe = StableDiffusionPipeline.from_pretrained(
+        MODEL_CREATE, revision="fp16", torch_dtype=torch.float16
+    )
+    pipe.to("cuda")
+    pipe.enable_model_cpu_offload()
+    return pipe
+
+
+def _load_inpaint_pipeline():
+    import diffusers
+    import torch
+    from diffusers import StableDiffusionInpaintPipeline
+
+    diffusers.logging.set_verbosity_info()
+
+    pipe = StableDiffusionInpaintPipeline.from_pretrained(
+        MODEL_INPAINT, torch_dtype=torch.float16
+    )
+    pipe.to("cuda")
+    pipe.enable_model_cpu_offload()
+    return pipe
+
+
+def register_pipeline(name, factory):
+    """
+    ------------------------------------------------
+    A function that registers a factory for a named pipeline ("create" or "inpaint").
+    An already loaded pipeline of the same name is released.
+
+    Args:
+    ------------------------------------------------
+    name: A string representing the name of the pipeline.
+    factory: A callable without arguments returning the pipeline.
+
+    Returns:
+    ------------------------------------------------
+    None
+    """
+    with _pipeline_lock:
+        release_pipeline(name)
+        _pipeline_factories[name] = factory
+
+
+def pipeline_model(name):
+    """
+    ------------------------------------------------
+    A function that identifies the model behind a named pipeline, e.g. for cache keys.
+
+    Args:
+    ------------------------------------------------
+    name: A string representing the name of the pipeline.
+
+    Returns:
+    ------------------------------------------------
+    A string, the model id of the default pipelines or the name of a registered factory.
+    """
+    factory = _pipeline_factories[name]
+    if factory is _load_create_pipeline:
+        return MODEL_CREATE
+    if factory is _load_inpaint_pipeline:
+        return MODEL_INPAINT
+    return "%s.%s" % (factory.__module__, factory.__qualname__)
+
+
+def get_pipeline(name):
+    """
+    ------------------------------------------------
+    A function that returns the named pipeline, constructing it on first use.
+
+    Args:
+    ------------------------------------------------
+    name: A string representing the name of the pipeline.
+
+    Returns:
+    ------------------------------------------------
+    The pipeline.
+    """
+    with _pipeline_lock:
+        # the requested pipeline is in use again, only the others can be idle
+        evict_pipelines(keep=(name,))
+        entry = _pipelines.get(name)
+        if entry is None:
+            if name not in _pipeline_factories:
+                raise KeyError("No pipeline registered under the name " + repr(name))
+            entry = _pipelines[name] = [_pipeline_factories[name](), 0.0]
+        entry[1] = time.monotonic()
+        _schedule_eviction()
+        return entry[0]
+
+
+def _schedule_eviction(delay=None):
+    # evict idle pipelines in the background, they are not only released on the next use
+    if PIPELINE_KEEP_ALIVE is None or _eviction["timer"] is not None:
+        return
+    timer = threading.Timer(
+        PIPELINE_KEEP_ALIVE if delay is None else delay, _evict_idle
+    )
+    timer.daemon = True
+    _eviction["timer"] = timer
+    timer.start()
+
+
+def _evict_idle():
+    with _pipeline_lock:
+        _eviction["timer"] = None
+        evict_pipelines()
+        if _pipelines and PIPELINE_KEEP_ALIVE is not None:
+            # check again when the next pipeline expires
+            used = min(used for _, used in _pipelines.values())
+            _schedule_eviction(max(0.0, used + PIPELINE_KEEP_ALIVE - time.monotonic()))
+
+
+def release_pipeline(name):
+    """
+    ------------------------------------------------
+    A function that drops a loaded pipeline and frees its memory.
+
+    Args:
+    ------------------------------------------------
+    name: A string representing the name of the pipeline.
 
-pipe_inpaint = StableDiffusionInpaintPipeline.from_pretrained(
-    "stabilityai/stable-diffusion-2-inpainting", torch_dtype=torch.float16
-)
-pipe_inpaint.to("cuda")
-pipe_inpaint.enable_model_cpu_offload()
+    Returns:
+    ------------------------------------------------
+    A boolean, True if a loaded pipeline was released.
+    """
+    with _pipeline_lock:
+        entry = _pipelines.pop(name, None)
+    if entry is None:
+        return False
+
+    del entry
+    gc.collect()
+    # only touch torch if a real pipeline already imported it
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+    return True
+
+
+def evict_pipelines(keep_alive=None, keep=()):
+    """
+    ------------------------------------------------
+    A function that releases all pipelines which have not been used for longer than keep_alive.
+
+    Args:
+    ------------------------------------------------
+    keep_alive: A float representing the keep-alive in seconds, defaults to PIPELINE_KEEP_ALIVE.
+    keep: An iterable of the names of pipelines that are kept regardless of their idle time.
+
+    Returns:
+    ------------------------------------------------
+    A list of the names of the released pipelines.
+    """
+    if keep_alive is None:
+        keep_alive = PIPELINE_KEEP_ALIVE
+    if keep_alive is None:
+        return []
+
+    now = time.monotonic()
+    with _pipeline_lock:
+        expired = [
+            n
+            for n, (_, used) in _pipelines.items()
+            if now - used > keep_alive and n not in keep
+        ]
+        for name in expired:
+            release_pipeline(name)
+    return expired
+
+
+def loaded_pipelines():
+    """
+    ------------------------------------------------
+    A function that lists the currently loaded pipelines.
+
+    Returns:
+    ------------------------------------------------
+    A list of strings representing the names of the loaded pipelines.
+    """
+    with _pipeline_lock:
+        return list(_pipelines)
+
+
+class StandInPipeline:
+    """
+    ------------------------------------------------
+    A lightweight stand-in for the diffusion pipelines, used for testing without weights.
+    It returns deterministic noise textures (create) or the input image (inpaint), resized to
+    height and width like the diffusion pipelines do.
+    """
+
+    def __call__(
+        self,
+        prompt,
+        height=512,
+        width=512,
+        num_inference_steps=50,
+        image=None,
+        mask_image=None,
+        num_images_per_prompt=1,
+        **kwargs
+    ):
+        if image is not None:
+            if hasattr(image, "permute"):
+                image = ((image.permute(0, 2, 3, 1) + 1) / 2).numpy()
+            if isinstance(image, np.ndarray):
+                images = [cv2.resize(i, (width, height)) for i in image]
+                return SimpleNamespace(images=np.stack(images))
+            if not isinstance(image, (list, tuple)):
+                image = [image]
+            images = [i.convert("RGB").resize((width, height)) for i in image]
+            return SimpleNamespace(images=images)
+
+        if isinstance(prompt, str):
+            prompt = [prompt]
+        generator = kwargs.get("generator")
+        images = []
+        for p in prompt:
+            for i in range(num_images_per_prompt):
+                if generator is not None:
+                    rng = generator[len(images)]
+                    if not isinstance(rng, np.random.Generator):
+                        # a torch generator, draw from numpy with the same seed
+                        rng = np.random.default_rng(rng.initial_seed())
+                else:
+                    rng = np.random.default_rng(
+                        sum(map(ord, p)) + num_inference_steps + i
+                    )
+                arr = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+                images.append(Image.fromarray(arr))
+        return SimpleNamespace(images=images)
+
+
+def _inference_mode():
+    # torch is only imported by the real pipelines, stand-ins run without it
+    torch = sys.modules.get("torch")
+    if torch is None:
+        return contextlib.nullcontext()
+    return torch.inference_mode()
+
+
+def _generators(seed, count):
+    # one generator per image, seeded seed, seed + 1, ..., None leaves the seeds random
+    if seed is None:
+        return None
+    torch = sys.modules.get("torch")
+    if torch is None:
+        # the stand-ins run without torch and draw from numpy generators
+        return [np.random.default_rng(seed + i) for i in range(count)]
+    # cpu generators give the same noise on every device
+    return [torch.Generator("cpu").manual_seed(seed + i) for i in range(count)]
+
+
+@contextlib.contextmanager
+def _circular_padding(pipe, enabled):
+    # switch the convolutions of the unet and vae to circular padding for the duration of a call,
+    # so the generated image wraps around at its borders and tiles without seam removal
+    models = [getattr(pipe, name, None) for name in ("unet", "vae")]
+    models = [model for model in models if model is not None]
+    if not enabled or not models:
+        yield
+        return
+
+    import torch
+
+    convs = [
+        module
+        for model in models
+        for module in model.modules()
+        if isinstance(module, torch.nn.Conv2d)
+    ]
+    with _padding_lock:
+        modes = [conv.padding_mode for conv in convs]
+        try:
+            for conv in convs:
+                conv.padding_mode = "circular"
+            yield
+        finally:
+            for conv, mode in zip(convs, modes):
+                conv.padding_mode = mode
+
+
+register_pipeline("create", _load_create_pipeline)
+register_pipeline("inpaint", _load_inpaint_pipeline)
+
+# AI2MAT_STAND_IN=1 replaces both pipelines by stand-ins, e.g. for headless tests
+if os.environ.get("AI2MAT_STAND_IN") == "1":
+    register_pipeline("create", StandInPipeline)
+    register_pipeline("inpaint", StandInPipeline)
 
 
 def prompt_create(material_type):
@@ -41,7 +348,7 @@ def prompt_create(material_type):
     return prompt
 
 
-def tex_create(prompt, size, num_inference_steps):
+def tex_create(prompt, size, num_inference_steps, tileable=False, seed=None):
     """
     ------------------------------------------------
     A function that creates a diffuse texture according to the given prompt by using StableDiffusion.
@@ -49,49 +356,233 @@ def tex_create(prompt, size, num_inference_steps):
     Args:
     ------------------------------------------------
     promt: A string representing the prompt.
-    height: An integer representing the height of the texture.
-    width: An integer representing the width of the texture.
+    size: An integer representing the height and width of the texture.
     num_inference_steps: An integer representing the number of inference steps.
+    tileable: A boolean, True generates with circular padding so the texture tiles natively.
+    seed: An optional integer, the same seed and settings create the same texture.
 
     Returns:
     ------------------------------------------------
     A PIL image representing the created texture.
     """
-    with torch.inference_mode():
-        tex = pipe_create(prompt, size, size, num_inference_steps).images[0]
-        return tex
+    return tex_create_batch(
+        prompt, size, num_inference_steps, tileable=tileable, seed=seed
+    )[0]
+
+
+def tex_create_batch(
+    prompts,
+    size,
+    num_inference_steps,
+    num_images_per_prompt=1,
+    batch_size=None,
+    tileable=False,
+    seed=None,
+):
+    """
+    ------------------------------------------------
+    A function that creates several diffuse textures in as few diffusion calls as possible.
+
+    Args:
+    ------------------------------------------------
+    prompts: A string or a list of strings representing the prompts.
+    size: An integer representing the height and width of the textures.
+    num_inference_steps: An integer representing the number of inference steps.
+    num_images_per_prompt: An integer representing the number of variants per prompt.
+    batch_size: An integer limiting the number of images per diffusion call, None runs all at once.
+    tileable: A boolean, True generates with circular padding so the textures tile natively.
+    seed: An optional integer, the i-th texture is created with the seed seed + i.
+
+    Returns:
+    ------------------------------------------------
+    A list of PIL images, grouped by prompt (all variants of the first prompt come first).
+    """
+    if isinstance(prompts, str):
+        prompts = [prompts]
+    pipe = get_pipeline("create")
+    generators = _generators(seed, len(prompts) * num_images_per_prompt)
+
+    with _inference_mode(), _circular_padding(pipe, tileable):
+        if batch_size is None:
+            return pipe(
+                prompts,
+                size,
+                size,
+                num_inference_steps,
+                num_images_per_prompt=num_images_per_prompt,
+                generator=generators,
+            ).images
+
+        # split the expanded prompt list into calls of at most batch_size images
+        expanded = [p for p in prompts for _ in range(num_images_per_prompt)]
+        texs = []
+        for i in range(0, len(expanded), batch_size):
+            texs += pipe(
+                expanded[i : i + batch_size],
+                size,
+                size,
+                num_inference_steps,
+                generator=generators and generators[i : i + batch_size],
+            ).images
+        return texs
+
+
+def tex_shift(tex, inverse=False, out=None, fraction=0.5):
+    """
+    ------------------------------------------------
+    A function that rolls a texture by a fraction of its size, by default by half so that its
+    borders meet in the center.
 
+    Args:
+    ------------------------------------------------
+    tex: A PIL image, a list of PIL images, a numpy array (HW, HWC or NHWC) or a torch
+        tensor (HW, CHW or NCHW) representing the texture(s).
+    inverse: A boolean, True undoes a previous shift (only differs for odd sizes).
+    out: An optional array or tensor of the same shape to write the shifted texture into.
+    fraction: A float representing the shift as a fraction of the size, 0.25 moves the
+        borders to a quarter and the center to three quarters of the texture.
 
-def tex_shift(tex):
-    # Get image dimensions
-    width, height = tex.size
+    Returns:
+    ------------------------------------------------
+    The shifted texture(s), of the same kind as tex.
+    """
+    if isinstance(tex, (list, tuple)):
+        return [tex_shift(t, inverse, fraction=fraction) for t in tex]
+
+    if isinstance(tex, Image.Image):
+        return Image.fromarray(tex_shift(np.asarray(tex), inverse, fraction=fraction))
+
+    # torch tensors are channels first, numpy arrays channels last
+    if type(tex).__module__.startswith("torch") or tex.ndim == 2:
+        y, x = tex.ndim - 2, tex.ndim - 1
+    else:
+        y, x = tex.ndim - 3, tex.ndim - 2
+
+    if out is None:
+        out = tex.clone() if hasattr(tex, "clone") else np.empty_like(tex)
+    elif out is tex:
+        raise ValueError("The shift can not be written into its own input")
+
+    height, width = tex.shape[y], tex.shape[x]
+    dy, dx = int(height * fraction), int(width * fraction)
+    if inverse:
+        dy, dx = height - dy, width - dx
+
+    def index(rows, cols):
+        idx = [slice(None)] * tex.ndim
+        idx[y], idx[x] = rows, cols
+        return tuple(idx)
+
+    # copy the four quadrants to their rolled position
+    for src_rows, dst_rows in (
+        (slice(dy, height), slice(0, height - dy)),
+        (slice(0, dy), slice(height - dy, height)),
+    ):
+        for src_cols, dst_cols in (
+            (slice(dx, width), slice(0, width - dx)),
+            (slice(0, dx), slice(width - dx, width)),
+        ):
+            out[index(dst_rows, dst_cols)] = tex[index(src_rows, src_cols)]
+
+    return out
+
+
+@functools.lru_cache(maxsize=None)
+def mask_array(kind, height, width, seam_width, feather=0):
+    """
+    ------------------------------------------------
+    A function that creates a single channel inpainting mask, cached per key.
 
-    # Check if image is square
-    if width != height:
-        raise ValueError("Image must be square")
-
-    # Split image into four quadrants
-    top_left = tex.crop((0, 0, width // 2, height // 2))
-    top_right = tex.crop((width // 2, 0, width, height // 2))
-    bottom_left = tex.crop((0, height // 2, width // 2, height))
-    bottom_right = tex.crop((width // 2, height // 2, width, height))
-
-    # Shift quadrants
-    top_left, top_right, bottom_left, bottom_right = (
-        bottom_right,
-        bottom_left,
-        top_right,
-        top_left,
-    )
+    Args:
+    ------------------------------------------------
+    kind: A string, "seam" (cross through the center), "center" (square in the center) or
+        "seamless" (seam cross and center square of a texture shifted by a quarter, see
+        tex_seamless).
+    height: An integer representing the height of the mask.
+    width: An integer representing the width of the mask.
+    seam_width: An integer representing the width of the seam.
+    feather: A float representing the sigma of the gaussian softening the mask edges, 0 keeps it hard.
+
+    Returns:
+    ------------------------------------------------
+    A read-only float32 numpy array of shape (height, width) in the range 0-1.
+    """
+    if kind == "seamless":
+        # the seam cross back on the borders and the center square, shifted by a quarter so
+        # that neither is split at the edges and each is inpainted in one piece
+        borders = tex_shift(mask_array("seam", height, width, seam_width), inverse=True)
+        center = mask_array("center", height, width, seam_width)
+        mask = tex_shift(np.maximum(borders, center), fraction=0.25)
+    else:
+        image = Image.new("L", (width, height), 0)
+        draw = ImageDraw.Draw(image)
+        if kind == "seam":
+            draw.line((0, height / 2, width, height / 2), fill=255, width=seam_width)
+            draw.line((width / 2, 0, width / 2, height), fill=255, width=seam_width)
+        elif kind == "center":
+            left = (width - seam_width) // 2
+            top = (height - seam_width) // 2
+            right = (width + seam_width) // 2
+            bottom = (height + seam_width) // 2
+            draw.rectangle((left, top, right, bottom), fill=255)
+        else:
+            raise ValueError("Unknown mask kind " + repr(kind))
+        mask = np.asarray(image, dtype=np.float32) / 255
+
+    if feather:
+        mask = cv2.GaussianBlur(mask, (0, 0), feather)
+
+    mask.flags.writeable = False
+    return mask
+
+
+@functools.lru_cache(maxsize=16)
+def mask_tensor(kind, height, width, seam_width, feather=0, device="cpu", dtype=None):
+    """
+    ------------------------------------------------
+    A function that returns a cached mask as a torch tensor ready for the inpainting pipeline.
+
+    Args:
+    ------------------------------------------------
+    kind, height, width, seam_width, feather: See mask_array.
+    device: A string representing the torch device of the tensor.
+    dtype: The torch dtype of the tensor, defaults to float32.
+
+    Returns:
+    ------------------------------------------------
+    A torch tensor of shape (1, 1, height, width) in the range 0-1.
+    """
+    import torch
+
+    mask = mask_array(kind, height, width, seam_width, feather)
+    return torch.tensor(mask, device=device, dtype=dtype or torch.float32)[None, None]
+
+
+def mask_cache_info():
+    """
+    ------------------------------------------------
+    A function that reports the hit and miss counters of the mask caches.
 
-    # Create a new image from the shifted quadrants
-    new_tex = Image.new("RGB", (width, height))
-    new_tex.paste(top_left, (0, 0))
-    new_tex.paste(top_right, (width // 2, 0))
-    new_tex.paste(bottom_left, (0, height // 2))
-    new_tex.paste(bottom_right, (width // 2, height // 2))
+    Returns:
+    ------------------------------------------------
+    A dictionary with the cache info of the "array" and the "tensor" cache.
+    """
+    return {"array": mask_array.cache_info(), "tensor": mask_tensor.cache_info()}
 
-    return new_tex
+
+def mask_cache_clear():
+    """
+    ------------------------------------------------
+    A function that empties the mask caches and resets their counters.
+    """
+    mask_array.cache_clear()
+    mask_tensor.cache_clear()
+
+
+def _mask_image(kind, tex, seam_width):
+    width, height = tex.size
+    mask = mask_array(kind, height, width, seam_width)
+    return Image.fromarray((mask * 255).astype(np.uint8)).convert("RGB")
 
 
 def tex_mask_seam(tex, seam_width):
@@ -108,13 +599,7 @@ def tex_mask_seam(tex, seam_width):
     ------------------------------------------------
     A PIL image representing the mask.
     """
-    size = tex.size[0]
-    mask = Image.new("RGB", (size, size), "black")
-    draw = ImageDraw.Draw(mask)
-    draw.line((0, size / 2, size, size / 2), fill="white", width=seam_width)
-    draw.line((size / 2, 0, size / 2, size), fill="white", width=seam_width)
-
-    return mask
+    return _mask_image("seam", tex, seam_width)
 
 
 def tex_mask_center(tex, seam_width):
@@ -125,25 +610,32 @@ def tex_mask_center(tex, seam_width):
     Args:
     ------------------------------------------------
     tex: A PIL image representing the texture.
-    mask_size: An integer representing the size of the mask.
+    seam_width: An integer representing the size of the mask.
 
     Returns:
     ------------------------------------------------
     A PIL image representing the mask.
     """
-    size = tex.size[0]
+    return _mask_image("center", tex, seam_width)
 
-    left = (size - seam_width) // 2
-    top = (size - seam_width) // 2
-    right = (size + seam_width) // 2
-    bottom = (size + seam_width) // 2
 
-    mask = Image.new("RGB", (size, size), "black")
+def tex_mask_seamless(tex, seam_width):
+    """
+    ------------------------------------------------
+    A function that creates the combined mask for the single pass seam removal.
+    The mask is meant for the texture shifted by a quarter and covers the seam cross as well
+    as the center of the unshifted texture, both in one piece.
 
-    draw = ImageDraw.Draw(mask)
-    draw.rectangle((left, top, right, bottom), fill="white")
+    Args:
+    ------------------------------------------------
+    tex: A PIL image representing the texture shifted by a quarter.
+    seam_width: An integer representing the width of the seam.
 
-    return mask
+    Returns:
+    ------------------------------------------------
+    A PIL image representing the mask.
+    """
+    return _mask_image("seamless", tex, seam_width)
 
 
 def tex_seam(prompt, tex, mask, num_inference_steps):
@@ -163,13 +655,141 @@ def tex_seam(prompt, tex, mask, num_inference_steps):
     ------------------------------------------------
     A PIL image representing the inpainted texture.
     """
-    seamless = pipe_inpaint(
-        prompt=prompt,
-        image=tex,
-        mask_image=mask,
-        num_inference_steps=num_inference_steps,
-    ).images[0]
-    return seamless
+    width, height = _inpaint_size(*tex.size)
+    with _inference_mode():
+        seamless = get_pipeline("inpaint")(
+            prompt=prompt,
+            image=tex,
+            mask_image=mask,
+            height=height,
+            width=width,
+            num_inference_steps=num_inference_steps,
+        ).images[0]
+        return seamless.resize(tex.size) if seamless.size != tex.size else seamless
+
+
+def tex_seam_batch(prompts, texs, masks, num_inference_steps):
+    """
+    ------------------------------------------------
+    A function that inpaints a batch of textures in a single diffusion call.
+
+    Args:
+    ------------------------------------------------
+    prompts: A string or a list of strings (one per texture) representing the prompts.
+    texs: A list of PIL images representing the textures.
+    masks: A PIL image shared by all textures or a list of PIL images (one per texture).
+    num_inference_steps: An integer representing the number of inference steps.
+
+    Returns:
+    ------------------------------------------------
+    A list of PIL images representing the inpainted textures.
+    """
+    if isinstance(prompts, str):
+        prompts = [prompts] * len(texs)
+    if not isinstance(masks, (list, tuple)):
+        masks = [masks] * len(texs)
+
+    # the batch shares one size, the textures of the first one
+    width, height = _inpaint_size(*texs[0].size)
+    with _inference_mode():
+        seamless = get_pipeline("inpaint")(
+            prompt=list(prompts),
+            image=list(texs),
+            mask_image=list(masks),
+            height=height,
+            width=width,
+            num_inference_steps=num_inference_steps,
+        ).images
+    return [s.resize(t.size) if s.size != t.size else s for s, t in zip(seamless, texs)]
+
+
+def tex_seamless(
+    prompt, tex, seam_width, num_inference_steps, single_pass=True, seed=None
+):
+    """
+    ------------------------------------------------
+    A function that makes a texture tileable by inpainting the seams introduced by shifting it.
+
+    Args:
+    ------------------------------------------------
+    prompt: A string representing the prompt.
+    tex: A PIL image or a list of PIL images representing the texture(s).
+    seam_width: An integer representing the width of the seam.
+    num_inference_steps: An integer representing the number of inference steps.
+    single_pass: A boolean, True inpaints the seam cross and the center with one combined
+        mask, False runs the seam cross and the center as two separate passes.
+    seed: An optional integer, the i-th texture is inpainted with the seed seed + i.
+
+    Returns:
+    ------------------------------------------------
+    A PIL image or a list of PIL images representing the seamless texture(s).
+    """
+    batch = isinstance(tex, (list, tuple))
+    texs = list(tex) if batch else [tex]
+
+    # the seam loop runs on one float batch and reuses its buffer for the shifts
+    arr = np.stack([np.asarray(t.convert("RGB")) for t in texs]).astype(np.float32)
+    arr /= 255
+
+    if single_pass:
+        # shifted by a quarter, the seam cross and the center square both lie inside the
+        # texture, a shift by half would split the center square into the four corners
+        shifted = tex_shift(arr, fraction=0.25)
+        shifted = _inpaint(
+            prompt, shifted, "seamless", seam_width, num_inference_steps, seed
+        )
+        arr = tex_shift(shifted, inverse=True, out=arr, fraction=0.25)
+    else:
+        shifted = tex_shift(arr)
+        shifted = _inpaint(
+            prompt, shifted, "seam", seam_width, num_inference_steps, seed
+        )
+        arr = tex_shift(shifted, inverse=True, out=arr)
+        arr = _inpaint(prompt, arr, "center", seam_width, num_inference_steps, seed)
+
+    texs = [Image.fromarray((a * 255).round().astype(np.uint8)) for a in arr]
+    return texs if batch else texs[0]
+
+
+def _inpaint_size(width, height):
+    # the pipelines work on multiples of 8 and default to 512 pixels without a size
+    return max(8, round(width / 8) * 8), max(8, round(height / 8) * 8)
+
+
+def _inpaint(prompt, batch, mask_kind, seam_width, num_inference_steps, seed=None):
+    # inpaint a float NHWC batch in the range 0-1 and return the result in the same layout
+    # load the pipeline first, the real one imports torch
+    pipe = get_pipeline("inpaint")
+    n, height, width = batch.shape[:3]
+    if not isinstance(pipe, StandInPipeline):
+        import torch
+
+        # tensors skip the PIL round-trip inside the pipeline
+        image = torch.from_numpy(batch).permute(0, 3, 1, 2) * 2 - 1
+        mask = mask_tensor(mask_kind, height, width, seam_width)
+        mask = mask.expand(n, -1, -1, -1)
+    else:
+        image = batch
+        mask = mask_array(mask_kind, height, width, seam_width)
+        mask = np.broadcast_to(mask, (n, 1, height, width))
+
+    size = _inpaint_size(width, height)
+    with _inference_mode():
+        result = pipe(
+            prompt=[prompt] * len(batch) if isinstance(prompt, str) else list(prompt),
+            image=image,
+            mask_image=mask,
+            height=size[1],
+            width=size[0],
+            num_inference_steps=num_inference_steps,
+            output_type="np",
+            generator=_generators(seed, n),
+        ).images
+    result = np.asarray(result, dtype=np.float32)
+    if result.shape[1:3] != (height, width):
+        # sizes that are no multiple of 8, back to the size of the batch
+        result = np.stack([cv2.resize(image, (width, height)) for image in result])
+    return np.ascontiguousarray(result)
 
 
 # %%
@@ -0,0 +1,357 @@
+# %%
+# pylint: disable=E1101
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from PIL import Image
+
+import ai2tex
+import tex2mat
+
+
+# %%
+# Helper functions
+def timed(func, *args, repeats=3, **kwargs):
+    """
+    ------------------------------------------------
+    A function that measures the best wall time of a function call.
+
+    Args:
+    ------------------------------------------------
+    func: The function to measure.
+    repeats: An integer representing the number of measured calls.
+
+    Returns:
+    ------------------------------------------------
+    A tuple of the best wall time in seconds and the result of the last call.
+    """
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def seam_score(tex):
+    """
+    ------------------------------------------------
+    A function that measures how visible the tiling seams of a texture are.
+
+    Args:
+    ------------------------------------------------
+    tex: A PIL image representing the texture.
+
+    Returns:
+    ------------------------------------------------
+    A float, the mean colour jump across the wrap-around borders or across the center lines,
+    whichever is larger, divided by the mean colour jump between neighbouring interior pixels
+    (1.0 means no visible seam). The center lines catch seams introduced by the seam removal
+    itself, which meet in the center of the texture.
+    """
+    arr = np.asarray(tex, dtype=np.float32)
+    h, w = arr.shape[0] // 2, arr.shape[1] // 2
+    borders = np.concatenate(
+        (np.abs(arr[:, -1] - arr[:, 0]).ravel(), np.abs(arr[-1] - arr[0]).ravel())
+    )
+    center = np.concatenate(
+        (np.abs(arr[:, w - 1] - arr[:, w]).ravel(), np.abs(arr[h - 1] - arr[h]).ravel())
+    )
+    interior = np.concatenate(
+        (np.abs(np.diff(arr, axis=1)).ravel(), np.abs(np.diff(arr, axis=0)).ravel())
+    )
+    return float(max(borders.mean(), center.mean()) / max(interior.mean(), 1e-6))
+
+
+def peak_memory(func, *args, **kwargs):
+    """
+    ------------------------------------------------
+    A function that measures the peak of the memory allocated during a function call.
+
+    Returns:
+    ------------------------------------------------
+    A tuple of the peak memory in bytes and the result of the call.
+    """
+    tracemalloc.start()
+    try:
+        result = func(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1], result
+    finally:
+        tracemalloc.stop()
+
+
+def noise_texture(size, seed=0):
+    """
+    ------------------------------------------------
+    A function that creates a smooth random RGB texture for benchmarking without a model.
+    """
+    arr = np.random.default_rng(seed).integers(0, 256, (size, size, 3), np.uint8)
+    return cv2.GaussianBlur(arr, (5, 5), 0)
+
+
+# slider settings of the interface defaults
+SETTINGS = (100, False, 100, False, 100, False, 33, 100)
+
+
+def separate_maps(arr, settings=SETTINGS):
+    """
+    ------------------------------------------------
+    The map synthesis as separate functions, as tex_to_mat computed it before the fused engine.
+    """
+    diffuse, inv_metal, metal, inv_rough, rough, inv_depth, normal, disp = settings
+    # the separate functions print their value ranges
+    with contextlib.redirect_stdout(io.StringIO()):
+        tex = (arr / 255).astype(np.float32)
+        depth = tex2mat.tex_to_depth(tex, inv_depth)
+        norm = tex2mat.depth_to_norm(depth, normal)
+        displacement = tex2mat.depth_to_disp(depth, disp + 1)
+        diff = tex2mat.tex_to_diff(tex, diffuse)
+        roughness = tex2mat.tex_to_rough(diff, norm, inv_rough, rough)
+        metalness = tex2mat.metallic_map(diff, roughness, norm, inv_metal, metal)
+    return {
+        "depth": depth,
+        "normal": norm,
+        "disp": displacement,
+        "diff": diff,
+        "rough": roughness,
+        "metal": metalness,
+    }
+
+
+# %%
+# Benchmarks
+def bench_seamless(material_type="wood", size=512, seam_width=32, steps=25, repeats=3):
+    """
+    ------------------------------------------------
+    Compares the single pass seam removal against the two pass seam removal.
+    """
+    prompt = ai2tex.prompt_create(material_type)
+    tex = ai2tex.tex_create(prompt, size, steps)
+    print("seamless  input      seam score %.3f" % seam_score(tex))
+
+    for single_pass in (False, True):
+        seconds, result = timed(
+            ai2tex.tex_seamless,
+            prompt,
+            tex,
+            seam_width,
+            steps,
+            single_pass=single_pass,
+            repeats=repeats,
+        )
+        print(
+            "seamless  %s  %8.3f s  seam score %.3f"
+            % ("1 pass " if single_pass else "2 passes", seconds, seam_score(result))
+        )
+
+
+def bench_tex2mat(sizes=(512, 2048, 8192), repeats=3):
+    """
+    ------------------------------------------------
+    Compares the fused synthesis engine against the separate map functions.
+    """
+    for size in sizes:
+        arr = noise_texture(size)
+        megapixels = size * size / 1e6
+        directory = tempfile.TemporaryDirectory(ignore_cleanup_errors=True)
+        tiled = tex2mat.memmap_maps(directory.name, size, size)
+        runs = (
+            ("separate", separate_maps, (arr,), {}),
+            ("fused", tex2mat.tex_to_maps, (arr,) + SETTINGS, {}),
+            ("tiled", tex2mat.tex_to_maps_tiled, (arr,) + SETTINGS, {"out": tiled}),
+        )
+        results = {}
+        for name, func, args, kwargs in runs:
+            seconds, _ = timed(func, *args, repeats=repeats, **kwargs)
+            peak, results[name] = peak_memory(func, *args, **kwargs)
+            print(
+                "tex2mat   %5d px  %-8s  %8.1f ms/MP  peak %8.1f MB"
+                % (size, name, 1000 * seconds / megapixels, peak / 2**20)
+            )
+
+        error = max(
+            float(np.abs(results["fused"][m] - results["separate"][m]).max())
+            for m in tex2mat.MAPS
+        )
+        identical = all(
+            np.array_equal(results["fused"][m], results["tiled"][m])
+            for m in tex2mat.MAPS
+        )
+        print(
+            "tex2mat   %5d px  max abs difference %.2e, tiled identical: %s"
+            % (size, error, identical)
+        )
+        del results, tiled
+        directory.cleanup()
+
+
+def bench_parallel(size=4096, repeats=3):
+    """
+    ------------------------------------------------
+    Measures how the map synthesis scales with the number of worker threads.
+    """
+    arr = noise_texture(size)
+    out = tex2mat.empty_maps(size, size)
+    workers, counts = 1, []
+    while workers <= (os.cpu_count() or 1):
+        counts.append(workers)
+        workers *= 2
+
+    baseline = None
+    for workers in counts:
+        seconds, _ = timed(
+            tex2mat.tex_to_maps,
+            arr,
+            *SETTINGS,
+            out=out,
+            workers=workers,
+            repeats=repeats,
+        )
+        baseline = baseline or seconds
+        print(
+            "parallel  %5d px  %3d workers  %8.3f s  speedup %5.2f"
+            % (size, workers, seconds, baseline / seconds)
+        )
+
+
+def bench_incremental(size=2048):
+    """
+    ------------------------------------------------
+    Measures the re-synthesis time of the material graph after single slider changes.
+    """
+    graph = tex2mat.MaterialGraph()
+    graph.set_texture(noise_texture(size))
+    changes = (
+        ("initial", SETTINGS),
+        ("normal", SETTINGS[:6] + (50, SETTINGS[7])),
+        ("displacement", SETTINGS[:6] + (50, 20)),
+        ("metalness", (SETTINGS[0], True) + SETTINGS[2:6] + (50, 20)),
+        ("unchanged", (SETTINGS[0], True) + SETTINGS[2:6] + (50, 20)),
+    )
+    for name, settings in changes:
+        seconds, _ = timed(graph.tex_to_maps, *settings, repeats=1)
+        print(
+            "graph     %5d px  %-12s  %8.3f s  recomputed %s"
+            % (size, name, seconds, ", ".join(graph.recomputed) or "-")
+        )
+
+
+def bench_pixel_upload(sizes=(512, 1024, 2048, 4096), repeats=3):
+    """
+    ------------------------------------------------
+    Compares the bulk pixel upload into blender images against the sequence assignment.
+    """
+    import bpy
+
+    import blenderengine
+
+    def sequence_upload(texture, tex):
+        arr = cv2.cvtColor(np.asarray(tex), cv2.COLOR_RGB2RGBA) / 255
+        texture.pixels[:] = arr.ravel()
+
+    for size in sizes:
+        tex = noise_texture(size)
+        texture = bpy.data.images.new("bench", size, size, float_buffer=True)
+        for name, upload in (
+            ("sequence", sequence_upload),
+            ("foreach", blenderengine.set_pixels),
+        ):
+            seconds, _ = timed(upload, texture, tex, repeats=repeats)
+            print(
+                "upload    %5d px  %-8s  %8.3f s  %8.1f MP/s"
+                % (size, name, seconds, size * size / 1e6 / seconds)
+            )
+        bpy.data.images.remove(texture)
+
+
+def bench_library(count=50, size=512):
+    """
+    ------------------------------------------------
+    Compares saving materials to the library one by one against saving them as a batch,
+    and the library sizes of the image layouts.
+    """
+    import blenderengine
+
+    # distinct maps, so no images are deduplicated
+    materials = [
+        ("bench", [Image.fromarray(noise_texture(size, 5 * i + j)) for j in range(5)])
+        for i in range(count)
+    ]
+    runs = (
+        ("single", {"bit_depth": 32}),
+        ("batch", {"bit_depth": 32}),
+        ("8 bit", {"bit_depth": 8}),
+        ("packed", {"bit_depth": 8, "packed": True}),
+    )
+    for name, layout in runs:
+        with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as path:
+            start = time.perf_counter()
+            if name == "single":
+                for material_name, maps in materials:
+                    blenderengine.save_material_library(
+                        path, material_name, *maps, **layout
+                    )
+            else:
+                blenderengine.save_material_library_batch(path, materials, **layout)
+            seconds = time.perf_counter() - start
+            folder = os.path.join(path, blenderengine.LIBRARY_FOLDER)
+            library_size = sum(entry.stat().st_size for entry in os.scandir(folder))
+        print(
+            "library   %5d px  %-8s  %8.1f ms/material  %8.2f MB/material"
+            % (size, name, 1000 * seconds / count, library_size / count / 2**20)
+        )
+
+
+def bench_renderfarm(count=32, size=512, processes=None):
+    """
+    ------------------------------------------------
+    Compares rendering material previews one by one against a pool of blender processes.
+    """
+    import blenderengine
+    import renderfarm
+
+    materials = [
+        ("bench", [Image.fromarray(noise_texture(size, 5 * i + j)) for j in range(5)])
+        for i in range(count)
+    ]
+
+    start = time.perf_counter()
+    for material_name, maps in materials:
+        blenderengine.render_material(50, material_name, *maps)
+    seconds = time.perf_counter() - start
+    print("render    %5d px  serial    %8.3f s/preview" % (size, seconds / count))
+
+    with renderfarm.RenderPool(processes) as pool:
+        # the first renders include the start up of the workers
+        pool.map(50, materials[: pool.processes])
+        start = time.perf_counter()
+        pool.map(50, materials)
+        seconds = time.perf_counter() - start
+    print(
+        "render    %5d px  %2d procs  %8.3f s/preview"
+        % (size, pool.processes, seconds / count)
+    )
+
+
+BENCHMARKS = {
+    "seamless": bench_seamless,
+    "tex2mat": bench_tex2mat,
+    "parallel": bench_parallel,
+    "incremental": bench_incremental,
+    "upload": bench_pixel_upload,
+    "library": bench_library,
+    "renderfarm": bench_renderfarm,
+}
+
+# %%
+if __name__ == "__main__":
+    # usage: python benchmark.py [name ...], runs all benchmarks without names
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
@@ -1,17 +1,71 @@
 # %%
 # pylint: disable=E1101
+import hashlib
 import math
 import os
+import re
+import sqlite3
+import tempfile
+import threading
+import uuid
 
 import bpy
-import cv2
 import numpy as np
 from PIL import Image
 
+# image node (and image) names of the maps in a material
+MAPS = ("diffuse", "metalness", "roughness", "normal", "displacement")
+
+
+# reusable float32 RGBA upload buffers, keyed by resolution
+_pixel_buffers = {}
+
+
+def set_pixels(texture, tex):
+    """
+    ------------------------------------------------
+    A function that writes a PIL image into a blender image of the same size.
+
+    Args:
+    ------------------------------------------------
+    texture: A blender image.
+    tex: A PIL image (RGB or single channel) or a uint8 numpy array.
+
+    Returns:
+    ------------------------------------------------
+    None
+    """
+    arr = np.asarray(tex)
+    height, width = arr.shape[:2]
+
+    buffer = _pixel_buffers.get((height, width))
+    if buffer is None:
+        if len(_pixel_buffers) >= 4:
+            _pixel_buffers.clear()
+        buffer = np.empty((height, width, 4), np.float32)
+        _pixel_buffers[(height, width)] = buffer
+
+    # RGBA range 0-1, single channel maps are spread over the colour channels
+    if arr.ndim == 2:
+        arr = arr[:, :, None]
+    np.divide(arr[:, :, :3], np.float32(255), out=buffer[:, :, :3], dtype=np.float32)
+    buffer[:, :, 3] = 1
+
+    # bulk copy of the contiguous buffer instead of a per element sequence assignment
+    texture.pixels.foreach_set(buffer.ravel())
+
 
 # function that creates a new material from the textures
 def create_material(
-    name, diffuse_map, metalness_map, roughness_map, normal_map, displacement_map
+    name,
+    diffuse_map,
+    metalness_map,
+    roughness_map,
+    normal_map,
+    displacement_map,
+    packed=False,
+    bit_depth=32,
+    dedup=False,
 ):
     """
     ------------------------------------------------
@@ -25,6 +79,12 @@ def create_material(
     roughness_map: A PIL image representing the roughness map.
     normal_map: A PIL image representing the normal map.
     displacement_map: A PIL image representing the displacement map.
+    packed: A boolean, True packs metalness, roughness and displacement into the red,
+        green and blue channel of a single "orm" image.
+    bit_depth: An integer representing the bit depth of the images, 8 stores them as
+        PNG, which is lossless for the 8 bit maps, 32 as float EXR.
+    dedup: A boolean, True reuses identical images created by earlier materials of
+        the session instead of creating them again.
 
     Returns:
     ------------------------------------------------
@@ -37,76 +97,46 @@ def create_material(
     nodes = mat.node_tree.nodes
     links = mat.node_tree.links
 
-    # create the image nodes for the textures
-    diffuse_node = nodes.new(type="ShaderNodeTexImage")
-    metalness_node = nodes.new(type="ShaderNodeTexImage")
-    roughness_node = nodes.new(type="ShaderNodeTexImage")
-    normal_node = nodes.new(type="ShaderNodeTexImage")
-    displacement_node = nodes.new(type="ShaderNodeTexImage")
-
-    # set the interpolation of the image nodes to closest to prevent blurring
-    diffuse_node.interpolation = "Closest"
-    metalness_node.interpolation = "Closest"
-    roughness_node.interpolation = "Closest"
-    normal_node.interpolation = "Closest"
-    displacement_node.interpolation = "Closest"
-
-    # get resolution of the textures
-    size = diffuse_map.size[0]
-
-    # create empty images for the textures according to the resolution
-    diffuse_texture = bpy.data.images.new(
-        name="diffuse", width=size, height=size, alpha=False, float_buffer=True
-    )
-    metalness_texture = bpy.data.images.new(
-        name="metalness", width=size, height=size, alpha=False, float_buffer=True
-    )
-    roughness_texture = bpy.data.images.new(
-        name="roughness", width=size, height=size, alpha=False, float_buffer=True
-    )
-    normal_texture = bpy.data.images.new(
-        name="normal", width=size, height=size, alpha=False, float_buffer=True
-    )
-    displacement_texture = bpy.data.images.new(
-        name="displacement", width=size, height=size, alpha=False, float_buffer=True
-    )
-
-    # converting PIL images to numpy arrays and then to RGBA range 0-1
-    diffuse_map = cv2.cvtColor(np.asarray(diffuse_map), cv2.COLOR_RGB2RGBA) / 255
-    metalness_map = cv2.cvtColor(np.asarray(metalness_map), cv2.COLOR_RGB2RGBA) / 255
-    roughness_map = cv2.cvtColor(np.asarray(roughness_map), cv2.COLOR_RGB2RGBA) / 255
-    normal_map = cv2.cvtColor(np.asarray(normal_map), cv2.COLOR_RGB2RGBA) / 255
-    displacement_map = (
-        cv2.cvtColor(np.asarray(displacement_map), cv2.COLOR_RGB2RGBA) / 255
-    )
-
-    # injecting the numpy arrays into the blender images
-    diffuse_texture.pixels[:] = (np.asarray(diffuse_map)).ravel()
-    metalness_texture.pixels[:] = (np.asarray(metalness_map)).ravel()
-    roughness_texture.pixels[:] = (np.asarray(roughness_map)).ravel()
-    normal_texture.pixels[:] = (np.asarray(normal_map)).ravel()
-    displacement_texture.pixels[:] = (np.asarray(displacement_map)).ravel()
-
-    # packing the images into the blender file
-    diffuse_texture.pack()
-    metalness_texture.pack()
-    roughness_texture.pack()
-    normal_texture.pack()
-    displacement_texture.pack()
-
-    # setting the color space of the images to sRGB
-    diffuse_texture.colorspace_settings.name = "sRGB"
-    metalness_texture.colorspace_settings.name = "sRGB"
-    roughness_texture.colorspace_settings.name = "sRGB"
-    normal_texture.colorspace_settings.name = "sRGB"
-    displacement_texture.colorspace_settings.name = "sRGB"
-
-    # setting the image nodes to use the images
-    diffuse_node.image = diffuse_texture
-    metalness_node.image = metalness_texture
-    roughness_node.image = roughness_texture
-    normal_node.image = normal_texture
-    displacement_node.image = displacement_texture
+    # create the images and image nodes of the maps, grayscale maps share one image
+    # and are split into its colour channels when packed
+    if packed:
+        orm_map = np.stack(
+            [
+                _channel(metalness_map),
+                _channel(roughness_map),
+                _channel(displacement_map),
+            ],
+            axis=-1,
+        )
+        maps = {"diffuse": diffuse_map, "normal": normal_map, "orm": orm_map}
+    else:
+        maps = {
+            "diffuse": diffuse_map,
+            "metalness": metalness_map,
+            "roughness": roughness_map,
+            "normal": normal_map,
+            "displacement": displacement_map,
+        }
+
+    image_nodes = {}
+    for i, (map_name, tex) in enumerate(maps.items()):
+        image_node = nodes.new(type="ShaderNodeTexImage")
+        # name the image nodes after their maps, so the images can be found and updated later
+        image_node.name = map_name
+        # set the interpolation of the image nodes to closest to prevent blurring
+        image_node.interpolation = "Closest"
+        image_node.location = (-1200, -200 * i)
+        image_node.image = _new_image(f"{name}_{map_name}", tex, bit_depth, dedup)
+        image_nodes[map_name] = image_node.outputs["Color"]
+
+    # split the packed image into its maps
+    if packed:
+        separate = nodes.new(type="ShaderNodeSeparateColor")
+        separate.location = (-900, -400)
+        links.new(image_nodes.pop("orm"), separate.inputs["Color"])
+        image_nodes["metalness"] = separate.outputs["Red"]
+        image_nodes["roughness"] = separate.outputs["Green"]
+        image_nodes["displacement"] = separate.outputs["Blue"]
 
     # creating the principled shader node
     principled = nodes.get("Principled BSDF")
@@ -117,11 +147,6 @@ def create_material(
     dispmap = nodes.new(type="ShaderNodeDisplacement")
 
     # set node locations
-    diffuse_node.location = (-1200, 0)
-    metalness_node.location = (-1200, -200)
-    roughness_node.location = (-1200, -400)
-    normal_node.location = (-1200, -600)
-    displacement_node.location = (-1200, -800)
     principled.location = (-300, 0)
     normalmap.location = (-600, 0)
     dispmap.location = (-900, 0)
@@ -142,11 +167,11 @@ def create_material(
     principled.inputs["Alpha"].default_value = 1.0
 
     # link textures
-    links.new(diffuse_node.outputs["Color"], principled.inputs["Base Color"])
-    links.new(metalness_node.outputs["Color"], principled.inputs["Metallic"])
-    links.new(roughness_node.outputs["Color"], principled.inputs["Roughness"])
-    links.new(normal_node.outputs["Color"], normalmap.inputs["Color"])
-    links.new(displacement_node.outputs["Color"], dispmap.inputs["Height"])
+    links.new(image_nodes["diffuse"], principled.inputs["Base Color"])
+    links.new(image_nodes["metalness"], principled.inputs["Metallic"])
+    links.new(image_nodes["roughness"], principled.inputs["Roughness"])
+    links.new(image_nodes["normal"], normalmap.inputs["Color"])
+    links.new(image_nodes["displacement"], dispmap.inputs["Height"])
 
     # link nodes
     links.new(principled.outputs["BSDF"], output.inputs["Surface"])
@@ -159,6 +184,50 @@ def create_material(
     return mat
 
 
+def _channel(tex):
+    # the first channel of a grayscale map, as a 2D uint8 array
+    arr = np.asarray(tex)
+    return arr if arr.ndim == 2 else arr[:, :, 0]
+
+
+# images created with dedup, keyed by the hash of their content
+_image_cache = {}
+
+
+def _new_image(name, tex, bit_depth=32, dedup=False):
+    # create a packed blender image from a PIL image or uint8 array
+    arr = np.ascontiguousarray(np.asarray(tex))
+    if dedup:
+        key = (hashlib.sha1(arr).hexdigest(), arr.shape, bit_depth)
+        try:
+            image = _image_cache.get(key)
+            if image is not None and image.name is not None:
+                return image
+        except ReferenceError:
+            pass
+
+    height, width = arr.shape[:2]
+    image = bpy.data.images.new(
+        name=name,
+        width=width,
+        height=height,
+        alpha=False,
+        float_buffer=bit_depth != 8,
+    )
+    # setting the color space of the image, before the pixels as it resets them. blender
+    # keeps float pixels as they are, byte images are read without a transform to match
+    image.colorspace_settings.name = "sRGB" if bit_depth != 8 else "Non-Color"
+    # injecting the map into the blender image
+    set_pixels(image, arr)
+
+    # packing the image into the blender file, as PNG (8 bit) or EXR (32 bit)
+    image.pack()
+
+    if dedup:
+        _image_cache[key] = image
+    return image
+
+
 # render the material
 def render_material(
     light_rotation,
@@ -168,6 +237,8 @@ def render_material(
     roughness_map,
     normal_map,
     displacement_map,
+    as_array=False,
+    environment_rotation=0,
 ):
     """
     ------------------------------------------------
@@ -176,28 +247,178 @@ def render_material(
     Args:
     ------------------------------------------------
     light_rotation: rotation of the light
-    material_name: name of the material
+    material_name: name of the material, the preview scene renders it with a material of
+        its own (PREVIEW_MATERIAL), so the name stays free for the material library
     diffuse_map: A PIL image representing the diffuse map.
     metalness_map: A PIL image representing the metalness map.
     roughness_map: A PIL image representing the roughness map.
     normal_map: A PIL image representing the normal map.
     displacement_map: A PIL image representing the displacement map.
+    as_array: A boolean, True returns the preview as an RGB uint8 numpy array.
+    environment_rotation: A float representing the rotation of the HDRI environment in degrees.
 
     Returns:
     ------------------------------------------------
     A PIL image representing the rendered material preview.
     """
 
-    # clear the scene
-    bpy.ops.wm.read_factory_settings(use_empty=True)
+    maps = (diffuse_map, metalness_map, roughness_map, normal_map, displacement_map)
+    render_np = _render_pass(light_rotation, maps, 100, 16, environment_rotation)
 
-    # create an HDRI environment
-    bpy.context.scene.world = bpy.data.worlds.new("New World")
-    world = bpy.context.scene.world
+    if as_array:
+        return render_np
+    return Image.fromarray(render_np)
+
+
+# (resolution percentage, samples) of the progressive preview passes
+PREVIEW_PASSES = ((50, 1), (100, 4), (100, 16))
+
+
+def render_material_progressive(
+    light_rotation,
+    material_name,
+    diffuse_map,
+    metalness_map,
+    roughness_map,
+    normal_map,
+    displacement_map,
+    cancel=None,
+    passes=PREVIEW_PASSES,
+    draft_engine="CYCLES",
+    environment_rotation=0,
+):
+    """
+    ------------------------------------------------
+    Render a material progressively, from a quick draft to the final preview
+
+    Args:
+    ------------------------------------------------
+    light_rotation, material_name and the maps: See render_material.
+    cancel: An optional threading.Event, once it is set no further passes are rendered.
+    passes: A sequence of (resolution percentage, samples) tuples, rendered in order.
+    draft_engine: A string representing the render engine of the first pass,
+        e.g. "BLENDER_EEVEE" for a rasterized draft.
+    environment_rotation: See render_material.
+
+    Returns:
+    ------------------------------------------------
+    A generator of PIL images representing the increasingly refined previews,
+    all scaled to the full preview resolution.
+    """
+    maps = (diffuse_map, metalness_map, roughness_map, normal_map, displacement_map)
+    for i, (percentage, samples) in enumerate(passes):
+        if cancel is not None and cancel.is_set():
+            return
+
+        engine = draft_engine if i == 0 else "CYCLES"
+        render_np = _render_pass(
+            light_rotation,
+            maps,
+            percentage,
+            samples,
+            environment_rotation,
+            engine,
+        )
+        render_image = Image.fromarray(render_np)
+        if percentage != 100:
+            size = _preview["resolution"]
+            render_image = render_image.resize(size, Image.BILINEAR)
+        yield render_image
+
+
+def _render_pass(
+    light_rotation,
+    maps,
+    percentage,
+    samples,
+    environment_rotation=0,
+    engine="CYCLES",
+):
+    # bpy is not thread-safe, renders from several workers are serialized
+    with _render_lock:
+        # the preview scene is built once and then only updated between renders,
+        # other renders may have swapped the maps between two progressive passes
+        if not _preview_valid():
+            if threading.current_thread() is not threading.main_thread():
+                # bpy.ops crash blender outside of the main thread
+                raise RuntimeError(
+                    "The preview scene has to be built on the main thread, "
+                    "call prepare_preview_scene before rendering from other threads"
+                )
+            _build_preview_scene(*maps)
+        elif _preview.get("maps") is not maps:
+            _update_preview_material(*maps)
+        _preview["maps"] = maps
+
+        # rotate the light around the z axis from -90 to 90 degrees
+        light_rotation = ((light_rotation * 1.8) - 90) * (math.pi / 180)
+        _preview["sun"].rotation_euler[2] = light_rotation
+        _rotate_environment(environment_rotation)
+
+        scene = bpy.context.scene
+        scene.render.engine = engine
+        scene.render.resolution_percentage = percentage
+        scene.cycles.samples = samples
+
+        # render the image
+        bpy.ops.render.render()
+        return _read_render()
+
+
+# serializes all access to the preview scene
+_render_lock = threading.RLock()
+
+# view transform of the previews, None keeps blender's default (AgX or Filmic)
+PREVIEW_VIEW_TRANSFORM = os.environ.get("AI2MAT_VIEW_TRANSFORM") or None
+
+
+def _read_render():
+    # read the last render as an 8 bit RGB numpy array
+    # the pixels of the render result are not accessible from python, and a compositor
+    # viewer is left empty by renders in background mode, so the render is saved to a
+    # private temporary file, which also applies the view transform
+    with tempfile.TemporaryDirectory(prefix="ai2mat_") as directory:
+        image_path = os.path.join(directory, "render.png")
+        bpy.data.images["Render Result"].save_render(image_path)
+        with Image.open(image_path) as render_image:
+            return np.array(render_image.convert("RGB"))
+
+
+# HDRI image of the preview environment, set AI2MAT_HDRI to use another one
+HDRI_PATH = os.environ.get(
+    "AI2MAT_HDRI",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "hdri.hdr"),
+)
+
+# world of the preview environment, loaded once per process
+_world = {}
+
+
+def _environment_world():
+    # reuse the world while it exists, so the HDRI is only decoded once
+    try:
+        if _world and _world["world"].name is not None:
+            return _world["world"]
+    except ReferenceError:
+        pass
+    _world.clear()
+
+    world = bpy.data.worlds.new("ai2mat_environment")
     world.use_nodes = True
     world_node_tree = world.node_tree
+    output_node = world_node_tree.nodes["World Output"]
+
+    if not os.path.isfile(HDRI_PATH):
+        # fall back to a plain grey background without the HDRI
+        print("HDRI image not found: %s" % HDRI_PATH)
+        background = world_node_tree.nodes["Background"]
+        background.inputs["Color"].default_value = (0.05, 0.05, 0.05, 1)
+        _world["world"] = world
+        return world
+
+    # create an HDRI environment
     env_node = world_node_tree.nodes.new("ShaderNodeTexEnvironment")
-    env_node.image = bpy.data.images.load(r"D:\ai2mat\assets\hdri.hdr")
+    env_node.image = bpy.data.images.load(HDRI_PATH, check_existing=True)
 
     # create a mapping node and link it to the environment node to rotate the environment
     mapping_node = world_node_tree.nodes.new("ShaderNodeMapping")
@@ -208,23 +429,88 @@ def render_material(
     world_node_tree.links.new(tex_coord_node.outputs[0], mapping_node.inputs[0])
 
     # link the environment node to the world output node
-    output_node = world_node_tree.nodes["World Output"]
     world_node_tree.links.new(env_node.outputs["Color"], output_node.inputs["Surface"])
 
+    _world["world"] = world
+    _world["mapping"] = mapping_node
+    return world
+
+
+def _rotate_environment(environment_rotation):
+    # rotate the environment around the z axis, in degrees
+    if "mapping" in _world:
+        rotation = environment_rotation * (math.pi / 180)
+        _world["mapping"].inputs[2].default_value[2] = rotation
+
+
+# objects of the preview scene, reused between renders
+_preview = {}
+
+# cycles threads of the preview renders, None uses all cores. Set by processes that
+# render side by side (see renderfarm.RenderPool), so they do not oversubscribe the cores
+RENDER_THREADS = None
+
+# name of the material of the preview scene, it is not named after the rendered materials
+# so their names stay free for the material library
+PREVIEW_MATERIAL = "ai2mat_preview"
+
+
+def _preview_valid():
+    # the scene is gone after a factory reset, e.g. by loading another file
+    try:
+        return bool(_preview) and _preview["cube"].name is not None
+    except ReferenceError:
+        return False
+
+
+def prepare_preview_scene():
+    """
+    ------------------------------------------------
+    Build the preview scene, unless it exists already. The scene is built with bpy.ops,
+    which only work on the main thread, so this has to be called from the main thread
+    before previews are rendered from other threads.
+
+    Returns:
+    ------------------------------------------------
+    None
+    """
+    if threading.current_thread() is not threading.main_thread():
+        raise RuntimeError("The preview scene can only be built on the main thread")
+    # only the main thread builds the scene, so a valid scene can be checked without the
+    # lock, which is held by a running render and would block the event loop
+    if _preview_valid():
+        return
+    with _render_lock:
+        if not _preview_valid():
+            # grey placeholder maps, replaced by the first render
+            grey = Image.new("RGB", (4, 4), (128, 128, 128))
+            _build_preview_scene(grey, grey, grey, grey, grey)
+
+
+def _build_preview_scene(
+    diffuse_map,
+    metalness_map,
+    roughness_map,
+    normal_map,
+    displacement_map,
+):
+    # clear the scene
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+    _preview.clear()
+
+    # use the cached HDRI environment
+    bpy.context.scene.world = _environment_world()
+
     # create a new camera and position it
-    # convert rotation 360 degrees to radians
     bpy.ops.object.camera_add(location=(0, -3.75, 0), rotation=(1.57, 0, 0))
     bpy.context.scene.camera = bpy.context.object
 
     # create a directional light and position it
     bpy.ops.object.light_add(type="SUN", location=(0, 0, 0), rotation=(0, 0, 0))
     bpy.context.object.data.energy = 10
-
-    # rotate the light around the z axis from -90 to 90 degrees
-    light_rotation = ((light_rotation * 1.8) - 90) * (math.pi / 180)
-    bpy.context.object.rotation_euler[2] = light_rotation
     # angle the light at 60 degrees
     bpy.context.object.rotation_euler[0] = 60 * (math.pi / 180)
+    _preview["sun"] = bpy.context.object
 
     # create a new cube at the origin and assign the material
     bpy.ops.mesh.primitive_cube_add(location=(0, 0, 0))
@@ -233,7 +519,7 @@ def render_material(
     bpy.ops.uv.cube_project(cube_size=1)
     bpy.ops.object.editmode_toggle()
     mat = create_material(
-        material_name,
+        PREVIEW_MATERIAL,
         diffuse_map,
         metalness_map,
         roughness_map,
@@ -241,30 +527,139 @@ def render_material(
         displacement_map,
     )
     bpy.context.object.data.materials.append(mat)
+    _preview["cube"] = bpy.context.object
+    _preview["material"] = mat
 
     # set the render settings
     bpy.context.scene.render.resolution_x = 600
     bpy.context.scene.render.resolution_y = 600
+    _preview["resolution"] = (600, 600)
     bpy.context.scene.render.engine = "CYCLES"
     bpy.context.scene.cycles.use_denoising = False
     bpy.context.scene.cycles.samples = 16
+    if RENDER_THREADS is not None:
+        bpy.context.scene.render.threads_mode = "FIXED"
+        bpy.context.scene.render.threads = RENDER_THREADS
     bpy.context.scene.render.image_settings.file_format = "PNG"
-    image_path = os.path.join(os.path.dirname(__file__), "temp.png")
-    # render the image
-    bpy.context.scene.render.filepath = image_path
-    bpy.ops.render.render(write_still=True)
-
-    # really dirty way to read the rendered image and jank the it out of PIL's scope for removal
-    render_image = Image.open(image_path)
-    render_np = np.array(render_image)
-    Image.Image.close(render_image)
-    render_image = Image.fromarray(render_np)
-    os.remove(image_path)
+    if PREVIEW_VIEW_TRANSFORM is not None:
+        bpy.context.scene.view_settings.view_transform = PREVIEW_VIEW_TRANSFORM
+
+
+def _update_preview_material(*maps):
+    # swap the pixels of the preview material's images, resizing them if necessary
+    mat = _preview["material"]
+    for name, tex in zip(MAPS, maps):
+        texture = mat.node_tree.nodes[name].image
+        if tuple(texture.size) != tex.size:
+            texture.scale(*tex.size)
+        set_pixels(texture, tex)
+
+
+# layout of a material library: one .blend file per material and a catalog of them
+LIBRARY_FOLDER = "materials"
+LIBRARY_CATALOG = "materiallibrary.sqlite"
+# single file library of earlier versions, still readable by load_material
+LEGACY_LIBRARY = "materiallibrary.blend"
+# longest name blender keeps for a material
+MAX_NAME_BYTES = 63
+
+
+def _catalog(path):
+    # open the catalog of a material library, creating or upgrading it if necessary
+    connection = sqlite3.connect(os.path.join(path, LIBRARY_CATALOG))
+    with connection:
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS materials (name TEXT PRIMARY KEY, file TEXT NOT NULL)"
+        )
+        # catalogs of earlier versions only have the name and file columns
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(materials)")}
+        for column in ("material_type TEXT", "prompt TEXT", "seed INTEGER"):
+            if column.split()[0] not in columns:
+                connection.execute("ALTER TABLE materials ADD COLUMN " + column)
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS materials_type ON materials (material_type)"
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS materials_prompt ON materials (prompt, seed)"
+        )
+        # number of names handed out per requested material name
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, count INTEGER NOT NULL)"
+        )
+        # catalog the materials of a single file library once, so new materials do not
+        # take their names
+        if connection.execute("PRAGMA user_version").fetchone()[0] < 1:
+            connection.executemany(
+                "INSERT OR IGNORE INTO materials (name, file) VALUES (?, ?)",
+                [(name, LEGACY_LIBRARY) for name in _legacy_materials(path)],
+            )
+            connection.execute("PRAGMA user_version = 1")
+    return connection
+
+
+def _legacy_materials(path):
+    # names of the materials in the single file library of earlier versions
+    file = os.path.join(path, LEGACY_LIBRARY)
+    if not os.path.exists(file):
+        return []
+    with _render_lock:
+        with bpy.data.libraries.load(file) as (data_from, _):
+            return list(data_from.materials)
+
+
+def _allocate_name(catalog, material_name):
+    # give the material a unique name (e.g. material_01) from the counter of its name,
+    # names that are already taken by other materials are skipped
+    while True:
+        row = catalog.execute(
+            "SELECT count FROM counters WHERE name = ?", (material_name,)
+        ).fetchone()
+        i = 0 if row is None else row[0]
+        catalog.execute(
+            "INSERT OR REPLACE INTO counters (name, count) VALUES (?, ?)",
+            (material_name, i + 1),
+        )
+        unique_name = material_name + "_" + str(i).zfill(2) if i > 0 else material_name
+        taken = catalog.execute(
+            "SELECT 1 FROM materials WHERE name = ?", (unique_name,)
+        ).fetchone()
+        if taken is None:
+            return unique_name
+
+
+def _shard_name(material_name):
+    # a file name for the material, without path separators or dots
+    return re.sub(r"[^\w\-]", "_", material_name)[:64]
+
+
+def _free_name(material_name):
+    # the materials are loaded by their catalog name, so a material of the session
+    # (e.g. a loaded one) that holds the name is renamed while the new one is written
+    # renaming reorders bpy.data.materials, the materials are collected first
+    holders = [
+        mat
+        for mat in bpy.data.materials
+        if mat.name == material_name and mat.library is None
+    ]
+    for mat in holders:
+        mat.name = "ai2mat_" + uuid.uuid4().hex
+    return [(mat, material_name) for mat in holders]
+
+
+def _remove_material(mat):
+    # remove a material and its images from the session
+    # deduplicated images can be used by several nodes, they are removed only once
+    images = {
+        node.image.name: node.image
+        for node in mat.node_tree.nodes
+        if node.type == "TEX_IMAGE" and node.image is not None
+    }
+    bpy.data.materials.remove(mat)
+    for image in images.values():
+        if image.users == 0:
+            bpy.data.images.remove(image)
 
-    return render_image
 
-
-# append existing material library if it exists
 def save_material_library(
     path,
     material_name,
@@ -273,58 +668,233 @@ def save_material_library(
     roughness_map,
     normal_map,
     displacement_map,
+    material_type=None,
+    prompt=None,
+    seed=None,
+    packed=False,
+    bit_depth=32,
 ):
     """
     ------------------------------------------------
-    Save a material to the material library
+    Save a material to the material library, as its own .blend file in the materials
+    folder of the library and an entry in the library's catalog
 
     Args:
     ------------------------------------------------
     path: path to the material library
-    material_name: name of the material
+    material_name: name of the material, a suffix is added if the name is taken
     diffuse_map: A PIL image representing the diffuse map.
     metalness_map: A PIL image representing the metalness map.
     roughness_map: A PIL image representing the roughness map.
     normal_map: A PIL image representing the normal map.
     displacement_map: A PIL image representing the displacement map.
+    material_type: An optional string representing the material type, for find_materials.
+    prompt: An optional string representing the prompt of the texture, for find_materials.
+    seed: An optional integer representing the seed of the texture, for find_materials.
+    packed, bit_depth: The image layout of the material, see create_material.
 
     Returns:
     ------------------------------------------------
-    None
+    A string representing the unique name of the saved material.
     """
+    maps = (diffuse_map, metalness_map, roughness_map, normal_map, displacement_map)
+    info = {"material_type": material_type, "prompt": prompt, "seed": seed}
+    return save_material_library_batch(
+        path, [(material_name, maps, info)], packed=packed, bit_depth=bit_depth
+    )[0]
 
-    # clear the scene
-    bpy.ops.wm.read_factory_settings(use_empty=True)
 
-    # append an existing material library, if it exists
-    if os.path.exists(path + "/materiallibrary.blend"):
-        with bpy.data.libraries.load(path + "/materiallibrary.blend") as (
-            data_from,
-            data_to,
-        ):
-            data_to.materials = data_from.materials
-            data_to.textures = data_from.textures
-            data_to.node_groups = data_from.node_groups
-
-    # check if material already exists and give it a unique name (e.g. material_001) 
-    # also check if any subfixes are already present
-    i = 0
-    for mat in bpy.data.materials:
-        if material_name in mat.name:
-            i += 1
-    if i > 0:
-        material_name = material_name + "_" + str(i).zfill(2)
+def save_material_library_batch(
+    path, materials, batch_size=None, packed=False, bit_depth=32
+):
+    """
+    ------------------------------------------------
+    Save many materials to the material library at once, sharing one .blend file and
+    one catalog transaction
 
-    mat = create_material(
-        material_name,
-        diffuse_map,
-        metalness_map,
-        roughness_map,
-        normal_map,
-        displacement_map,
-    )
+    Args:
+    ------------------------------------------------
+    path: path to the material library
+    materials: A list of (name, maps) or (name, maps, info) tuples, maps being the
+        diffuse, metalness, roughness, normal and displacement PIL images and info a dict
+        with the optional material_type, prompt and seed of save_material_library.
+    batch_size: An optional integer, the number of materials per .blend file. All
+        materials are created in one session and file by default, a smaller batch size
+        limits the memory use of very large batches.
+    packed, bit_depth: The image layout of the materials, see create_material.
+        Identical images are stored once per .blend file.
+
+    Returns:
+    ------------------------------------------------
+    A list of strings representing the unique names of the saved materials.
+    """
+    materials = [tuple(material) for material in materials]
+    if not materials:
+        return []
+    batch_size = batch_size or len(materials)
+
+    os.makedirs(os.path.join(path, LIBRARY_FOLDER), exist_ok=True)
+    catalog = _catalog(path)
+    try:
+        # reserve the names first, so concurrent saves cannot pick the same ones
+        with catalog:
+            catalog.execute("BEGIN IMMEDIATE")
+            names = [_allocate_name(catalog, material[0]) for material in materials]
+            for name in names:
+                # blender cuts longer names, the material could not be found again
+                if len(name.encode("utf-8")) > MAX_NAME_BYTES:
+                    raise ValueError("Material name too long: %s" % name)
+            files, rows = [], []
+            for i, (name, material) in enumerate(zip(names, materials)):
+                if i % batch_size == 0:
+                    # a single material keeps its own file, a batch shares one
+                    shard = _shard_name(name) if len(materials) == 1 else "batch"
+                    shard += "_" + uuid.uuid4().hex
+                    files.append(os.path.join(LIBRARY_FOLDER, shard + ".blend"))
+                info = material[2] if len(material) > 2 else {}
+                rows.append(
+                    (
+                        name,
+                        files[-1],
+                        info.get("material_type"),
+                        info.get("prompt"),
+                        info.get("seed"),
+                    )
+                )
+            catalog.executemany(
+                "INSERT INTO materials (name, file, material_type, prompt, seed) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+
+        try:
+            # bpy is shared with the preview renders
+            with _render_lock:
+                for j, file in enumerate(files):
+                    batch = slice(j * batch_size, (j + 1) * batch_size)
+                    mats, renamed = [], []
+                    try:
+                        for name, material in zip(names[batch], materials[batch]):
+                            renamed += _free_name(name)
+                            mats.append(
+                                create_material(
+                                    name,
+                                    *material[1],
+                                    packed=packed,
+                                    bit_depth=bit_depth,
+                                    dedup=True,
+                                )
+                            )
+                        # write only the new materials, their packed images along
+                        bpy.data.libraries.write(
+                            os.path.join(path, file),
+                            set(mats),
+                            fake_user=True,
+                            compress=True,
+                        )
+                    finally:
+                        for mat in mats:
+                            _remove_material(mat)
+                        for mat, name in renamed:
+                            mat.name = name
+        except Exception:
+            with catalog:
+                catalog.executemany(
+                    "DELETE FROM materials WHERE name = ?", [(name,) for name in names]
+                )
+            for file in files:
+                if os.path.exists(os.path.join(path, file)):
+                    os.remove(os.path.join(path, file))
+            raise
+    finally:
+        catalog.close()
+
+    return names
+
+
+def find_materials(path, material_type=None, prompt=None, seed=None):
+    """
+    ------------------------------------------------
+    Find the materials of a material library by their material type, prompt and seed
+
+    Args:
+    ------------------------------------------------
+    path: path to the material library
+    material_type: An optional string, only materials of this material type are returned.
+    prompt: An optional string, only materials created from this prompt are returned.
+    seed: An optional integer, only materials created with this seed are returned.
+
+    Returns:
+    ------------------------------------------------
+    A list of strings representing the material names, in the order they were saved.
+    """
+    if not os.path.exists(os.path.join(path, LIBRARY_CATALOG)):
+        return []
+    filters = {"material_type": material_type, "prompt": prompt, "seed": seed}
+    filters = {column: value for column, value in filters.items() if value is not None}
+    query = "SELECT name FROM materials"
+    if filters:
+        query += " WHERE " + " AND ".join(column + " = ?" for column in filters)
+    catalog = _catalog(path)
+    try:
+        rows = catalog.execute(query + " ORDER BY rowid", tuple(filters.values()))
+        return [name for (name,) in rows.fetchall()]
+    finally:
+        catalog.close()
+
+
+def list_materials(path):
+    """
+    ------------------------------------------------
+    List the materials of a material library
 
-    # save the material library
-    data_blocks = {*bpy.data.materials, *bpy.data.textures, *bpy.data.node_groups}
-    save_file = path + "/materiallibrary.blend"
-    bpy.data.libraries.write(save_file, data_blocks, fake_user=True, compress=True)
+    Args:
+    ------------------------------------------------
+    path: path to the material library
+
+    Returns:
+    ------------------------------------------------
+    A list of strings representing the material names, in the order they were saved.
+    """
+    return find_materials(path)
+
+
+def load_material(path, material_name, link=False):
+    """
+    ------------------------------------------------
+    Load a single material of a material library into the session
+
+    Args:
+    ------------------------------------------------
+    path: path to the material library
+    material_name: name of the material
+    link: A boolean, True links the material instead of appending it.
+
+    Returns:
+    ------------------------------------------------
+    A blender material.
+    """
+    file = None
+    if os.path.exists(os.path.join(path, LIBRARY_CATALOG)):
+        catalog = _catalog(path)
+        try:
+            row = catalog.execute(
+                "SELECT file FROM materials WHERE name = ?", (material_name,)
+            ).fetchone()
+        finally:
+            catalog.close()
+        if row is not None:
+            file = row[0]
+    # materials that were saved by earlier versions are in the single file library
+    if file is None:
+        file = LEGACY_LIBRARY
+    file = os.path.join(path, file)
+    if not os.path.exists(file):
+        raise KeyError("Material not in the library: %s" % material_name)
+
+    with _render_lock:
+        with bpy.data.libraries.load(file, link=link) as (data_from, data_to):
+            if material_name not in data_from.materials:
+                raise KeyError("Material not in the library: %s" % material_name)
+            data_to.materials = [material_name]
+        return data_to.materials[0]
@@ -1,4 +1,7 @@
 # %%
+import threading
+import time
+
 import numpy as np
 import PySimpleGUI as sg
 from PIL import Image, ImageTk
@@ -7,6 +10,8 @@ import ai2tex
 import blenderengine
 import helper
 import tex2mat
+import texcache
+import jobs
 
 sg.theme("Dark Purple 4")
 
@@ -27,6 +32,11 @@ settings = [
         sg.Text("Material typ   ", font='"Courier New" 12'),
         sg.Input(key="-material_type-"),
     ],
+    [
+        sg.Text("Seed           ", font='"Courier New" 12'),
+        sg.Input(key="-seed-", size=(12, 1)),
+        sg.Text("empty for a random seed", font='"Courier New" 10'),
+    ],
     [
         sg.Text("Texture quality", font='"Courier New" 12'),
         sg.Radio("25", "texture_quality", key="qual_25"),
@@ -48,6 +58,11 @@ settings = [
         sg.Radio("75", "seam_quality", key="seam_qual_75"),
         sg.Radio("100", "seam_quality", key="seam_qual_100"),
     ],
+    [
+        sg.Text("Seam mode      ", font='"Courier New" 12'),
+        sg.Radio("Inpaint", "seam_mode", key="seam_mode_inpaint", default=True),
+        sg.Radio("Circular", "seam_mode", key="seam_mode_circular"),
+    ],
     [
         sg.Text("Load from file ", font='"Courier New" 12'),
         sg.In(size=(25, 1), enable_events=True, key="-RAW_FILE-"),
@@ -66,13 +81,20 @@ settings = [
             orientation="h",
             size=(25, 10),
             key="diffuse_strength",
+            enable_events=True,
         ),
     ],
     [
         sg.Text("Invert metalness     ", font='"Courier New" 12'),
-        sg.Radio("True", "metalness_invert", key="metalness_invert_true"),
         sg.Radio(
-            "False", "metalness_invert", key="metalness_invert_false", default=True
+            "True", "metalness_invert", key="metalness_invert_true", enable_events=True
+        ),
+        sg.Radio(
+            "False",
+            "metalness_invert",
+            key="metalness_invert_false",
+            default=True,
+            enable_events=True,
         ),
     ],
     [
@@ -83,13 +105,20 @@ settings = [
             orientation="h",
             size=(25, 10),
             key="metallness_strength",
+            enable_events=True,
         ),
     ],
     [
         sg.Text("Invert roughness     ", font='"Courier New" 12'),
-        sg.Radio("True", "roughness_invert", key="roughness_invert_true"),
         sg.Radio(
-            "False", "roughness_invert", key="roughness_invert_false", default=True
+            "True", "roughness_invert", key="roughness_invert_true", enable_events=True
+        ),
+        sg.Radio(
+            "False",
+            "roughness_invert",
+            key="roughness_invert_false",
+            default=True,
+            enable_events=True,
         ),
     ],
     [
@@ -100,12 +129,19 @@ settings = [
             orientation="h",
             size=(25, 10),
             key="roughness_strength",
+            enable_events=True,
         ),
     ],
     [
         sg.Text("Invert depth         ", font='"Courier New" 12'),
-        sg.Radio("True", "depth_invert", key="depth_invert_true"),
-        sg.Radio("False", "depth_invert", key="depth_invert_false", default=True),
+        sg.Radio("True", "depth_invert", key="depth_invert_true", enable_events=True),
+        sg.Radio(
+            "False",
+            "depth_invert",
+            key="depth_invert_false",
+            default=True,
+            enable_events=True,
+        ),
     ],
     [
         sg.Text("Normal strength      ", font='"Courier New" 12'),
@@ -115,6 +151,7 @@ settings = [
             orientation="h",
             size=(25, 10),
             key="normal_strength",
+            enable_events=True,
         ),
     ],
     [
@@ -125,6 +162,7 @@ settings = [
             orientation="h",
             size=(25, 10),
             key="displacement_strength",
+            enable_events=True,
         ),
     ],
     # Execution
@@ -139,6 +177,7 @@ settings = [
             orientation="h",
             size=(25, 10),
             key="light_rotation",
+            enable_events=True,
         ),
     ],
     [
@@ -249,6 +288,218 @@ window = sg.Window("AI2MAT", layout, finalize=True)
 # global variable for the PIL image object, representing the texture
 tex = None
 
+# prompt of the generated texture, stored with the material in the library
+prompt = None
+# seed of the generated texture, the same seed and settings reproduce the texture
+seed = None
+
+# synthesis graph, recomputes only the maps affected by changed sliders
+material_graph = tex2mat.MaterialGraph()
+
+# guards the material graph, which is shared by the synthesis jobs and saving
+material_lock = threading.Lock()
+
+# synthesis graph of a downscaled proxy of the texture, for the live slider previews
+proxy_graph = tex2mat.MaterialGraph()
+proxy = {"tex": None, "tex_res": None, "image": None}
+
+# seconds the sliders have to settle before the proxy is re-synthesized
+DEBOUNCE = 0.15
+
+# events of the settings that change the material maps
+SYNTHESIS_EVENTS = {
+    "diffuse_strength",
+    "metalness_invert_true",
+    "metalness_invert_false",
+    "metallness_strength",
+    "roughness_invert_true",
+    "roughness_invert_false",
+    "roughness_strength",
+    "depth_invert_true",
+    "depth_invert_false",
+    "normal_strength",
+    "displacement_strength",
+}
+
+# time of the next debounced preview update, and whether it re-synthesizes the maps
+preview_due = None
+preview_synthesis = False
+
+# the maps of the current material, at the texture resolution
+depth = diff = rough = metal = norm = disp = None
+
+# cancellation event of the running progressive preview render
+render_cancel = threading.Event()
+
+
+def start_preview_render(light_rotation, *maps):
+    """
+    ------------------------------------------------
+    A function that renders the preview progressively in a background thread, every pass
+    is sent back to the event loop as a "-RENDER_PASS-" event. A running render is cancelled.
+
+    Args:
+    ------------------------------------------------
+    light_rotation: A float representing the rotation of the light.
+    maps: The PIL images of the maps, in the order of blenderengine.render_material.
+
+    Returns:
+    ------------------------------------------------
+    None
+    """
+    global render_cancel
+    render_cancel.set()
+    cancel = render_cancel = threading.Event()
+
+    # the scene is built with bpy.ops on the event loop, the thread only renders
+    blenderengine.prepare_preview_scene()
+
+    def render():
+        for preview in blenderengine.render_material_progressive(
+            light_rotation, "preview_material", *maps, cancel=cancel
+        ):
+            if cancel.is_set():
+                break
+            window.write_event_value("-RENDER_PASS-", (cancel, preview))
+
+    threading.Thread(target=render, daemon=True).start()
+
+
+# runs generation and synthesis in the background, the results are "-JOB-" events
+executor = jobs.JobExecutor(window)
+
+
+def generate_texture(
+    job,
+    material_type,
+    seed,
+    quality,
+    tileable,
+    seam_width,
+    seam_removal_quality,
+    synthesis,
+):
+    """
+    ------------------------------------------------
+    A job that generates a seamless texture and synthesizes its material.
+
+    Args:
+    ------------------------------------------------
+    job: The jobs.Job.
+    material_type: A string representing the material type.
+    seed: An integer representing the seed of the texture.
+    quality, tileable, seam_width, seam_removal_quality: The generation settings.
+    synthesis: A tuple of the slider settings, bit depth and texture resolution.
+
+    Returns:
+    ------------------------------------------------
+    None, the results are posted as "texture" and "maps" stages.
+    """
+    prompt = ai2tex.prompt_create(material_type)
+    tex = texcache.tex_create(prompt, 512, quality, seed, tileable=tileable)
+    if not job.post("texture", (prompt, seed, tex)):
+        return
+
+    # remove the seams, circular padded textures are tileable already
+    if not tileable:
+        tex = texcache.tex_seamless(prompt, tex, seam_width, seam_removal_quality, seed)
+        if not job.post("texture", (prompt, seed, tex)):
+            return
+
+    synthesize_material(job, tex, synthesis)
+
+
+def retile_texture(job, prompt, seed, tex, seam_width, seam_removal_quality, synthesis):
+    """
+    ------------------------------------------------
+    A job that removes the seams of the texture again and synthesizes its material.
+    The arguments are those of generate_texture.
+    """
+    tex = texcache.tex_seamless(prompt, tex, seam_width, seam_removal_quality, seed)
+    if not job.post("texture", (prompt, seed, tex)):
+        return
+
+    synthesize_material(job, tex, synthesis)
+
+
+def synthesize_material(job, tex, synthesis):
+    """
+    ------------------------------------------------
+    A job that synthesizes the material maps of a texture, posted as the "maps" stage.
+    The arguments are those of generate_texture.
+    """
+    with material_lock:
+        maps = material_maps(material_graph, tex, synthesis)
+
+    job.post("maps", (synthesis, maps))
+
+
+def material_maps(graph, tex, synthesis):
+    """
+    ------------------------------------------------
+    A function that synthesizes the material maps of a texture with a synthesis graph.
+
+    Args:
+    ------------------------------------------------
+    graph: A tex2mat.MaterialGraph.
+    tex: A PIL image representing the texture.
+    synthesis: A tuple of the slider settings, bit depth and texture resolution.
+
+    Returns:
+    ------------------------------------------------
+    A tuple of PIL images (depth, diff, rough, metal, norm, disp), all but the depth map
+    downsized to the texture resolution.
+    """
+    *settings, bit_depth, tex_res = synthesis
+
+    # texture to material
+    graph.set_texture(tex)
+    raw, depth, diff, metal, rough, norm, disp = graph.tex_to_mat(*settings, bit_depth)
+
+    diff = helper.tex_downsize(diff, (tex_res, tex_res))
+    rough = helper.tex_downsize(rough, (tex_res, tex_res))
+    metal = helper.tex_downsize(metal, (tex_res, tex_res))
+    norm = helper.tex_downsize(norm, (tex_res, tex_res))
+    disp = helper.tex_downsize(disp, (tex_res, tex_res))
+
+    return depth, diff, rough, metal, norm, disp
+
+
+def proxy_maps(tex, synthesis):
+    # synthesize the maps of the texture downscaled to the texture resolution, which is
+    # fast enough for live previews of the sliders
+    tex_res = synthesis[-1]
+    if proxy["tex"] is not tex or proxy["tex_res"] != tex_res:
+        proxy["image"] = helper.tex_downsize(tex, (tex_res, tex_res))
+        proxy["tex"], proxy["tex_res"] = tex, tex_res
+    return material_maps(proxy_graph, proxy["image"], synthesis)
+
+
+def show_texture(tex, tex_res):
+    # update the tile preview with a 3x3 tiling of the texture
+    tex_tile = helper.tex_downsize(tex, (tex_res, tex_res))
+    tex_tile = helper.tex_tile(tex_tile, (3, 3))
+    tex_tile = helper.tex_upsize(tex_tile, (600, 600))
+    window["-PREVIEW_TILE-"].update(data=ImageTk.PhotoImage(image=tex_tile))
+
+
+def show_maps(depth, diff, rough, metal, norm, disp):
+    # update the material previews
+    diff_preview = helper.tex_upsize(diff, (200, 200))
+    rough_preview = helper.tex_upsize(rough, (200, 200))
+    metal_preview = helper.tex_upsize(metal, (200, 200))
+    depth_preview = helper.tex_upsize(depth, (200, 200))
+    norm_preview = helper.tex_upsize(norm, (200, 200))
+    disp_preview = helper.tex_upsize(disp, (200, 200))
+
+    window["-PREVIEW_DIFF-"].update(data=ImageTk.PhotoImage(image=diff_preview))
+    window["-PREVIEW_ROUGH-"].update(data=ImageTk.PhotoImage(image=rough_preview))
+    window["-PREVIEW_METAL-"].update(data=ImageTk.PhotoImage(image=metal_preview))
+    window["-PREVIEW_DEPTH-"].update(data=ImageTk.PhotoImage(image=depth_preview))
+    window["-PREVIEW_NORMAL-"].update(data=ImageTk.PhotoImage(image=norm_preview))
+    window["-PREVIEW_DISP-"].update(data=ImageTk.PhotoImage(image=disp_preview))
+
+
 # Display and interact with the Window using an Event Loop
 startup = True
 while True:
@@ -287,11 +538,24 @@ while True:
         # set the startup flag to false
         startup = False
 
-    event, values = window.read()
+    # wake up for the debounced preview update
+    timeout = None
+    if preview_due is not None:
+        timeout = max(0, int(1000 * (preview_due - time.monotonic())))
+    event, values = window.read(timeout=timeout)
 
     if event == sg.WINDOW_CLOSED:
+        render_cancel.set()
+        executor.shutdown()
         break
 
+    # show the passes of the current progressive preview render, stale ones are dropped
+    if event == "-RENDER_PASS-":
+        cancel, preview = values[event]
+        if cancel is render_cancel:
+            window["-PREVIEW_RENDER-"].update(data=ImageTk.PhotoImage(image=preview))
+        continue
+
     # get the values from the interface
     # material type
     material_type = values["-material_type-"]
@@ -326,6 +590,12 @@ while True:
     elif values["seam_qual_100"]:
         seam_removal_quality = 100
 
+    # generate tileable textures directly instead of inpainting the seams
+    if values["seam_mode_circular"]:
+        tileable = True
+    else:
+        tileable = False
+
     # invert metalness
     if values["metalness_invert_true"]:
         invert_metalness = True
@@ -384,76 +654,84 @@ while True:
     elif values["bit_depth_8"]:
         bit_depth = 8
 
+    # slider settings of the material synthesis
+    synthesis = (
+        diffuse_strength,
+        invert_metalness,
+        metallness_strength,
+        invert_roughness,
+        roughness_strength,
+        invert_depth,
+        normal_strength,
+        displacement_strength,
+        bit_depth,
+        tex_res,
+    )
+
+    # slider changes update the previews once the slider settles
+    if event in SYNTHESIS_EVENTS or event == "light_rotation":
+        if tex is not None:
+            preview_due = time.monotonic() + DEBOUNCE
+            preview_synthesis = preview_synthesis or event in SYNTHESIS_EVENTS
+        continue
+
+    if event == sg.TIMEOUT_KEY:
+        if preview_due is not None and time.monotonic() >= preview_due:
+            preview_due = None
+            if preview_synthesis:
+                depth, diff, rough, metal, norm, disp = proxy_maps(tex, synthesis)
+                show_maps(depth, diff, rough, metal, norm, disp)
+                preview_synthesis = False
+            if diff is not None:
+                start_preview_render(light_rotation, diff, rough, metal, norm, disp)
+        continue
+
+    # show the stage results of the current background job, stale ones are dropped
+    if event == executor.event:
+        job, stage, value = values[event]
+        if not executor.is_current(job):
+            continue
+        if stage == "texture":
+            prompt, seed, tex = value
+            show_texture(tex, tex_res)
+        elif stage == "maps":
+            job_synthesis, maps = value
+            if job_synthesis != synthesis:
+                # the sliders moved while the job ran, preview them on the proxy
+                preview_due, preview_synthesis = time.monotonic(), True
+                continue
+            depth, diff, rough, metal, norm, disp = maps
+            start_preview_render(light_rotation, diff, rough, metal, norm, disp)
+            show_maps(depth, diff, rough, metal, norm, disp)
+        elif stage == "error":
+            sg.popup_error(value)
+        continue
+
     # generate the texture
     if event == "Generate":
         # create the texture
         if material_type == "":
             sg.popup_error("No material type entered!")
 
-        else:
-            prompt = ai2tex.prompt_create(material_type)
-            tex = ai2tex.tex_create(prompt, 512, quality)
+        elif values["-seed-"].strip() and not values["-seed-"].strip().isdigit():
+            sg.popup_error("The seed has to be a positive whole number!")
 
-            # remove the seams
-            tex = ai2tex.tex_shift(tex)
-            mask = ai2tex.tex_mask_seam(tex, seam_width)
-            tex = ai2tex.tex_seam(prompt, tex, mask, seam_removal_quality)
-            tex = ai2tex.tex_shift(tex)
-
-            mask = ai2tex.tex_mask_center(tex, seam_width)
-            tex = ai2tex.tex_seam(prompt, tex, mask, seam_removal_quality)
-
-            # texture to material
-            raw, depth, diff, metal, rough, norm, disp = tex2mat.tex_to_mat(
-                tex,
-                diffuse_strength,
-                invert_metalness,
-                metallness_strength,
-                invert_roughness,
-                roughness_strength,
-                invert_depth,
-                normal_strength,
-                displacement_strength,
-                bit_depth,
-            )
-
-            tex_tile = helper.tex_downsize(tex, (tex_res, tex_res))
-            tex_tile = helper.tex_tile(tex_tile, (3, 3))
-            tex_tile = helper.tex_upsize(tex_tile, (600, 600))
-            window["-PREVIEW_TILE-"].update(data=ImageTk.PhotoImage(image=tex_tile))
-
-            diff = helper.tex_downsize(diff, (tex_res, tex_res))
-            rough = helper.tex_downsize(rough, (tex_res, tex_res))
-            metal = helper.tex_downsize(metal, (tex_res, tex_res))
-            norm = helper.tex_downsize(norm, (tex_res, tex_res))
-            disp = helper.tex_downsize(disp, (tex_res, tex_res))
-
-            preview = blenderengine.render_material(
-                light_rotation, "preview_material", diff, rough, metal, norm, disp
-            )
-            window["-PREVIEW_RENDER-"].update(data=ImageTk.PhotoImage(image=preview))
-
-            diff_preview = helper.tex_upsize(diff, (200, 200))
-            rough_preview = helper.tex_upsize(rough, (200, 200))
-            metal_preview = helper.tex_upsize(metal, (200, 200))
-            depth_preview = helper.tex_upsize(depth, (200, 200))
-            norm_preview = helper.tex_upsize(norm, (200, 200))
-            disp_preview = helper.tex_upsize(disp, (200, 200))
-
-            window["-PREVIEW_DIFF-"].update(data=ImageTk.PhotoImage(image=diff_preview))
-            window["-PREVIEW_ROUGH-"].update(
-                data=ImageTk.PhotoImage(image=rough_preview)
-            )
-            window["-PREVIEW_METAL-"].update(
-                data=ImageTk.PhotoImage(image=metal_preview)
-            )
-            window["-PREVIEW_DEPTH-"].update(
-                data=ImageTk.PhotoImage(image=depth_preview)
-            )
-            window["-PREVIEW_NORMAL-"].update(
-                data=ImageTk.PhotoImage(image=norm_preview)
+        else:
+            # random textures get a seed as well, it is saved with the material
+            if values["-seed-"].strip():
+                new_seed = int(values["-seed-"])
+            else:
+                new_seed = int(np.random.randint(2**31))
+            executor.submit(
+                generate_texture,
+                material_type,
+                new_seed,
+                quality,
+                tileable,
+                seam_width,
+                seam_removal_quality,
+                synthesis,
             )
-            window["-PREVIEW_DISP-"].update(data=ImageTk.PhotoImage(image=disp_preview))
 
     if event == "Retile":
         if tex == None:
@@ -461,66 +739,16 @@ while True:
             sg.popup_error("No material present!")
 
         else:
-            # remove the seams
-            tex = ai2tex.tex_shift(tex)
-            mask = ai2tex.tex_mask_seam(tex, seam_width)
-            tex = ai2tex.tex_seam(prompt, tex, mask, seam_removal_quality)
-            tex = ai2tex.tex_shift(tex)
-
-            mask = ai2tex.tex_mask_center(tex, seam_width)
-            tex = ai2tex.tex_seam(prompt, tex, mask, seam_removal_quality)
-
-            # texture to material
-            raw, depth, diff, metal, rough, norm, disp = tex2mat.tex_to_mat(
+            # loaded images have no prompt, they are inpainted after the material type
+            executor.submit(
+                retile_texture,
+                prompt or ai2tex.prompt_create(material_type),
+                seed,
                 tex,
-                diffuse_strength,
-                invert_metalness,
-                metallness_strength,
-                invert_roughness,
-                roughness_strength,
-                invert_depth,
-                normal_strength,
-                displacement_strength,
-                bit_depth,
-            )
-
-            tex_tile = helper.tex_downsize(tex, (tex_res, tex_res))
-            tex_tile = helper.tex_tile(tex_tile, (3, 3))
-            tex_tile = helper.tex_upsize(tex_tile, (600, 600))
-            window["-PREVIEW_TILE-"].update(data=ImageTk.PhotoImage(image=tex_tile))
-
-            diff = helper.tex_downsize(diff, (tex_res, tex_res))
-            rough = helper.tex_downsize(rough, (tex_res, tex_res))
-            metal = helper.tex_downsize(metal, (tex_res, tex_res))
-            norm = helper.tex_downsize(norm, (tex_res, tex_res))
-            disp = helper.tex_downsize(disp, (tex_res, tex_res))
-
-            preview = blenderengine.render_material(
-                light_rotation, "preview_material", diff, rough, metal, norm, disp
-            )
-            window["-PREVIEW_RENDER-"].update(data=ImageTk.PhotoImage(image=preview))
-
-            diff_preview = helper.tex_upsize(diff, (200, 200))
-            rough_preview = helper.tex_upsize(rough, (200, 200))
-            metal_preview = helper.tex_upsize(metal, (200, 200))
-            depth_preview = helper.tex_upsize(depth, (200, 200))
-            norm_preview = helper.tex_upsize(norm, (200, 200))
-            disp_preview = helper.tex_upsize(disp, (200, 200))
-
-            window["-PREVIEW_DIFF-"].update(data=ImageTk.PhotoImage(image=diff_preview))
-            window["-PREVIEW_ROUGH-"].update(
-                data=ImageTk.PhotoImage(image=rough_preview)
-            )
-            window["-PREVIEW_METAL-"].update(
-                data=ImageTk.PhotoImage(image=metal_preview)
-            )
-            window["-PREVIEW_DEPTH-"].update(
-                data=ImageTk.PhotoImage(image=depth_preview)
-            )
-            window["-PREVIEW_NORMAL-"].update(
-                data=ImageTk.PhotoImage(image=norm_preview)
+                seam_width,
+                seam_removal_quality,
+                synthesis,
             )
-            window["-PREVIEW_DISP-"].update(data=ImageTk.PhotoImage(image=disp_preview))
 
     # synthesize the material from the texture
     if event == "Synthesize":
@@ -528,57 +756,7 @@ while True:
             sg.popup_error("No material present!")
 
         else:
-            raw, depth, diff, metal, rough, norm, disp = tex2mat.tex_to_mat(
-                tex,
-                diffuse_strength,
-                invert_metalness,
-                metallness_strength,
-                invert_roughness,
-                roughness_strength,
-                invert_depth,
-                normal_strength,
-                displacement_strength,
-                bit_depth,
-            )
-
-            tex_tile = helper.tex_downsize(tex, (tex_res, tex_res))
-            tex_tile = helper.tex_tile(tex_tile, (3, 3))
-            tex_tile = helper.tex_upsize(tex_tile, (600, 600))
-            window["-PREVIEW_TILE-"].update(data=ImageTk.PhotoImage(image=tex_tile))
-
-            diff = helper.tex_downsize(diff, (tex_res, tex_res))
-            rough = helper.tex_downsize(rough, (tex_res, tex_res))
-            metal = helper.tex_downsize(metal, (tex_res, tex_res))
-            norm = helper.tex_downsize(norm, (tex_res, tex_res))
-            disp = helper.tex_downsize(disp, (tex_res, tex_res))
-
-            preview = blenderengine.render_material(
-                light_rotation, "preview_material", diff, rough, metal, norm, disp
-            )
-            window["-PREVIEW_RENDER-"].update(data=ImageTk.PhotoImage(image=preview))
-
-            diff_preview = helper.tex_upsize(diff, (200, 200))
-            rough_preview = helper.tex_upsize(rough, (200, 200))
-            metal_preview = helper.tex_upsize(metal, (200, 200))
-            depth_preview = helper.tex_upsize(depth, (200, 200))
-            norm_preview = helper.tex_upsize(norm, (200, 200))
-            disp_preview = helper.tex_upsize(disp, (200, 200))
-
-            window["-PREVIEW_DIFF-"].update(data=ImageTk.PhotoImage(image=diff_preview))
-            window["-PREVIEW_ROUGH-"].update(
-                data=ImageTk.PhotoImage(image=rough_preview)
-            )
-            window["-PREVIEW_METAL-"].update(
-                data=ImageTk.PhotoImage(image=metal_preview)
-            )
-            window["-PREVIEW_DEPTH-"].update(
-                data=ImageTk.PhotoImage(image=depth_preview)
-            )
-            window["-PREVIEW_NORMAL-"].update(
-                data=ImageTk.PhotoImage(image=norm_preview)
-            )
-            window["-PREVIEW_DISP-"].update(data=ImageTk.PhotoImage(image=disp_preview))
-            print("synthesized")
+            executor.submit(synthesize_material, tex, synthesis)
 
     if event == "Load":
         if values["-RAW_FILE-"] == "":
@@ -586,56 +764,14 @@ while True:
             continue
 
         else:
-            # save the texture
+            # load the texture
             path = values["-RAW_FILE-"]
             tex = Image.open(path)
+            # a loaded image was not generated, it has no prompt or seed
+            prompt = seed = None
+            show_texture(tex, tex_res)
 
-            # texture to material
-            raw, diff, rough, metal, depth, norm, disp = tex2mat.tex_to_mat(
-                tex,
-                diffuse_strength,
-                invert_metalness,
-                metallness_strength,
-                invert_roughness,
-                roughness_strength,
-                invert_depth,
-                normal_strength,
-                displacement_strength,
-                bit_depth,
-            )
-
-            diff = helper.tex_downsize(diff, (tex_res, tex_res))
-            rough = helper.tex_downsize(rough, (tex_res, tex_res))
-            metal = helper.tex_downsize(metal, (tex_res, tex_res))
-            norm = helper.tex_downsize(norm, (tex_res, tex_res))
-            disp = helper.tex_downsize(disp, (tex_res, tex_res))
-
-            preview = blenderengine.render_material(
-                light_rotation, "preview_material", diff, rough, metal, norm, disp
-            )
-            window["-PREVIEW_RENDER-"].update(data=ImageTk.PhotoImage(image=preview))
-
-            diff_preview = helper.tex_upsize(diff, (200, 200))
-            rough_preview = helper.tex_upsize(rough, (200, 200))
-            metal_preview = helper.tex_upsize(metal, (200, 200))
-            depth_preview = helper.tex_upsize(depth, (200, 200))
-            norm_preview = helper.tex_upsize(norm, (200, 200))
-            disp_preview = helper.tex_upsize(disp, (200, 200))
-
-            window["-PREVIEW_DIFF-"].update(data=ImageTk.PhotoImage(image=diff_preview))
-            window["-PREVIEW_ROUGH-"].update(
-                data=ImageTk.PhotoImage(image=rough_preview)
-            )
-            window["-PREVIEW_METAL-"].update(
-                data=ImageTk.PhotoImage(image=metal_preview)
-            )
-            window["-PREVIEW_DEPTH-"].update(
-                data=ImageTk.PhotoImage(image=depth_preview)
-            )
-            window["-PREVIEW_NORMAL-"].update(
-                data=ImageTk.PhotoImage(image=norm_preview)
-            )
-            window["-PREVIEW_DISP-"].update(data=ImageTk.PhotoImage(image=disp_preview))
+            executor.submit(synthesize_material, tex, synthesis)
 
     # save the material to a blender library
     if event == "Save":
@@ -643,15 +779,19 @@ while True:
             sg.popup_error("Please select a directory to save the textures")
             continue
 
+        elif tex == None:
+            sg.popup_error("No material present!")
+            continue
+
         else:
             # save the texture
             material_type = material_type.replace(" ", "-")
 
-            diff = helper.tex_downsize(diff, (tex_res, tex_res))
-            rough = helper.tex_downsize(rough, (tex_res, tex_res))
-            metal = helper.tex_downsize(metal, (tex_res, tex_res))
-            norm = helper.tex_downsize(norm, (tex_res, tex_res))
-            disp = helper.tex_downsize(disp, (tex_res, tex_res))
+            # synthesize the material at full resolution, the previews may be proxies
+            with material_lock:
+                depth, diff, rough, metal, norm, disp = material_maps(
+                    material_graph, tex, synthesis
+                )
 
             # add to blender library
             blenderengine.save_material_library(
@@ -662,6 +802,10 @@ while True:
                 rough,
                 norm,
                 disp,
+                material_type=values["-material_type-"],
+                prompt=prompt,
+                seed=seed,
+                bit_depth=8,
             )
         sg.popup("Textures successfully saved")
 
@@ -0,0 +1,117 @@
+# %%
+# pylint: disable=E1101
+import itertools
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+
+# %%
+# Background jobs of the interface
+class Job:
+    """
+    ------------------------------------------------
+    A background job, passed to the job function to report its stage results and to
+    check whether it has been superseded by a newer job.
+    """
+
+    def __init__(self, executor, token):
+        self.token = token
+        self._executor = executor
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def post(self, stage, value=None):
+        """
+        ------------------------------------------------
+        Send the result of a stage to the event loop, unless the job was cancelled.
+
+        Args:
+        ------------------------------------------------
+        stage: A string representing the name of the stage.
+        value: The result of the stage.
+
+        Returns:
+        ------------------------------------------------
+        A boolean, False if the job was cancelled and should stop.
+        """
+        if self.cancelled():
+            return False
+        self._executor.window.write_event_value(
+            self._executor.event, (self, stage, value)
+        )
+        return True
+
+
+class JobExecutor:
+    """
+    ------------------------------------------------
+    Runs the generation and synthesis stages of the interface off the event loop. The
+    results are posted to the window as (job, stage, value) events. Submitting a job
+    cancels the previous one, so stale jobs stop at their next stage and queued ones
+    never start.
+
+    Usage:
+    ------------------------------------------------
+    jobs = JobExecutor(window)
+    jobs.submit(generate, prompt)
+
+    event, values = window.read()
+    if event == jobs.event:
+        job, stage, value = values[event]
+        if jobs.is_current(job):
+            ...
+    """
+
+    def __init__(self, window, event="-JOB-"):
+        self.window = window
+        self.event = event
+        # one worker, the stages share the material graph and the texture
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ai2mat")
+        self._tokens = itertools.count()
+        self._current = None
+
+    def submit(self, func, *args, **kwargs):
+        """
+        ------------------------------------------------
+        Run a job function in the background, superseding the current job.
+
+        Args:
+        ------------------------------------------------
+        func: A function called as func(job, *args, **kwargs), it posts its stage results
+            with job.post and returns early when that returns False.
+
+        Returns:
+        ------------------------------------------------
+        The Job.
+        """
+        self.cancel()
+        job = self._current = Job(self, next(self._tokens))
+        self._pool.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def _run(self, job, func, args, kwargs):
+        if job.cancelled():
+            return
+        try:
+            func(job, *args, **kwargs)
+        except Exception:
+            job.post("error", traceback.format_exc())
+        else:
+            job.post("done")
+
+    def is_current(self, job):
+        return job is self._current and not job.cancelled()
+
+    def cancel(self):
+        if self._current is not None:
+            self._current.cancel()
+
+    def shutdown(self):
+        self.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
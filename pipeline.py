@@ -0,0 +1,459 @@
+# %%
+# pylint: disable=E1101
+import collections
+import csv
+import json
+import os
+import queue
+import threading
+import time
+
+import ai2tex
+import helper
+import renderfarm
+import tex2mat
+import texcache
+
+# %%
+# Manifest
+# settings of a manifest item and their defaults, the defaults of the interface
+DEFAULTS = {
+    "material_type": None,
+    "name": None,
+    "seed": None,
+    "size": 512,
+    "quality": 50,
+    "tileable": False,
+    "seam_width": 32,
+    "seam_quality": 25,
+    "diffuse_strength": 100,
+    "invert_metalness": False,
+    "metallness_strength": 100,
+    "invert_roughness": False,
+    "roughness_strength": 100,
+    "invert_depth": False,
+    "normal_strength": 33,
+    "displacement_strength": 100,
+    "bit_depth": 8,
+    "tex_res": 128,
+    "light_rotation": 50,
+}
+
+# slider settings, parsed as floats like the values of the interface sliders
+FLOAT_KEYS = (
+    "diffuse_strength",
+    "metallness_strength",
+    "roughness_strength",
+    "normal_strength",
+    "displacement_strength",
+    "light_rotation",
+)
+
+
+def _parse(key, value):
+    # convert a manifest value to the type of its default
+    default = DEFAULTS[key]
+    if value is None or value == "":
+        return default
+    if isinstance(default, bool):
+        if isinstance(value, str):
+            return value.strip().lower() in ("1", "true", "yes")
+        return bool(value)
+    if key in FLOAT_KEYS:
+        return float(value)
+    if isinstance(default, int) or key == "seed":
+        return int(value)
+    return value
+
+
+def read_manifest(path):
+    """
+    ------------------------------------------------
+    A function that reads the materials of a batch from a CSV or JSONL manifest.
+
+    Args:
+    ------------------------------------------------
+    path: A string representing the path of the manifest. CSV files need a header row,
+        JSONL files hold one object per line. The columns or keys are those of DEFAULTS,
+        only material_type is required.
+
+    Returns:
+    ------------------------------------------------
+    A list of dictionaries, one per material, with all settings of DEFAULTS.
+    """
+    with open(path, newline="", encoding="utf-8") as file:
+        if path.lower().endswith(".csv"):
+            rows = list(csv.DictReader(file))
+        else:
+            rows = [json.loads(line) for line in file if line.strip()]
+
+    items = []
+    for i, row in enumerate(rows):
+        unknown = set(row) - set(DEFAULTS)
+        if unknown:
+            raise ValueError(
+                "Unknown manifest keys in item %d: %s" % (i, ", ".join(sorted(unknown)))
+            )
+        item = {key: _parse(key, row.get(key)) for key in DEFAULTS}
+        if not item["material_type"]:
+            raise ValueError("Manifest item %d has no material_type" % i)
+        if item["name"] is None:
+            item["name"] = item["material_type"].replace(" ", "-")
+        # position in the manifest, names can repeat
+        item["index"] = i
+        items.append(item)
+    return items
+
+
+# %%
+# Stages
+# every stage takes a manifest item and returns it with its results added, so the
+# stages can run one after another or as steps of a pipelined executor
+def stage_generate(item):
+    """
+    ------------------------------------------------
+    Generates the seamless texture of an item ("prompt" and "tex"). Items with a seed are
+    reproducible and are read from the texture cache when generated before.
+    """
+    item["prompt"] = ai2tex.prompt_create(item["material_type"])
+    tex = texcache.tex_create(
+        item["prompt"],
+        item["size"],
+        item["quality"],
+        item["seed"],
+        tileable=item["tileable"],
+    )
+    # remove the seams, circular padded textures are tileable already
+    if not item["tileable"]:
+        tex = texcache.tex_seamless(
+            item["prompt"], tex, item["seam_width"], item["seam_quality"], item["seed"]
+        )
+    item["tex"] = tex
+    return item
+
+
+def stage_synthesize(item, workers=1):
+    """
+    ------------------------------------------------
+    Synthesizes the material maps of an item ("maps": diffuse, metalness, roughness,
+    normal and displacement map at the texture resolution) with workers threads.
+    """
+    settings = [item[key] for key in tex2mat.MaterialGraph.SETTINGS]
+    raw, depth, diff, metal, rough, norm, disp = tex2mat.tex_to_mat(
+        item["tex"], *settings, item["bit_depth"], workers=workers
+    )
+    size = (item["tex_res"], item["tex_res"])
+    item["maps"] = tuple(
+        helper.tex_downsize(tex, size) for tex in (diff, metal, rough, norm, disp)
+    )
+    return item
+
+
+def stage_render(item, directory, preview=None):
+    """
+    ------------------------------------------------
+    Renders the preview of an item into directory/<index>_<name>.png ("preview"). A preview
+    that was rendered elsewhere, e.g. by a renderfarm.RenderPool, is only written.
+    """
+    if preview is None:
+        import blenderengine
+
+        preview = blenderengine.render_material(
+            item["light_rotation"], item["name"], *item["maps"]
+        )
+    file = "%05d_%s.png" % (item["index"], item["name"])
+    item["preview"] = os.path.join(directory, file)
+    preview.save(item["preview"])
+    return item
+
+
+def stage_save(items, library, packed=False):
+    """
+    ------------------------------------------------
+    Saves the materials of several items to a material library in one write ("material",
+    the unique name in the library).
+    """
+    import blenderengine
+
+    materials = [
+        (
+            item["name"],
+            item["maps"],
+            {
+                "material_type": item["material_type"],
+                "prompt": item["prompt"],
+                "seed": item["seed"],
+            },
+        )
+        for item in items
+    ]
+    names = blenderengine.save_material_library_batch(
+        library, materials, packed=packed, bit_depth=8
+    )
+    for item, name in zip(items, names):
+        item["material"] = name
+        # the maps are written, the images are not needed anymore
+        del item["tex"], item["maps"]
+    return items
+
+
+# %%
+# Execution
+def run(
+    items, library, previews=None, batch_size=16, packed=False, workers=1, log=print
+):
+    """
+    ------------------------------------------------
+    A function that runs the full pipeline (generate, synthesize, render, save) for the
+    items of a manifest, one item and stage after another.
+
+    Args:
+    ------------------------------------------------
+    items: A list of manifest items, see read_manifest.
+    library: A string representing the path of the material library.
+    previews: An optional string representing a directory for the preview renders.
+    batch_size: An integer representing the number of materials per library write.
+    packed: A boolean, True saves the materials with packed images.
+    workers: An integer representing the number of threads synthesizing a material.
+    log: A function called with a progress message per item.
+
+    Returns:
+    ------------------------------------------------
+    A list of the finished items.
+    """
+    if previews is not None:
+        os.makedirs(previews, exist_ok=True)
+
+    finished, pending = [], []
+    for i, item in enumerate(items):
+        stage_synthesize(stage_generate(item), workers)
+        if previews is not None:
+            stage_render(item, previews)
+        pending.append(item)
+        if len(pending) >= batch_size or i == len(items) - 1:
+            finished += stage_save(pending, library, packed)
+            pending = []
+        log("[%d/%d] %s" % (i + 1, len(items), item["name"]))
+    return finished
+
+
+# %%
+# Pipelined execution
+# marks the end of the items in a stage queue
+_DONE = object()
+
+
+def _put(stage_queue, item, stop):
+    # a blocking put that gives up once the pipeline is stopped
+    while not stop.is_set():
+        try:
+            stage_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(stage_queue, stop):
+    # a blocking get that gives up once the pipeline is stopped
+    while not stop.is_set():
+        try:
+            return stage_queue.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+def _stage(name, func, inbox, outbox, metrics, stop, errors, flush=None):
+    # run a stage on the items of its inbox, func returns the finished items
+    stats = metrics[name]
+    while True:
+        start = time.perf_counter()
+        item = _get(inbox, stop)
+        stats["starved"] += time.perf_counter() - start
+        if item is _DONE:
+            break
+
+        start = time.perf_counter()
+        try:
+            results = func(item)
+        except Exception as error:
+            errors.append((name, item, error))
+            stop.set()
+            break
+        stats["busy"] += time.perf_counter() - start
+        stats["items"] += 1
+
+        start = time.perf_counter()
+        for result in results:
+            _put(outbox, result, stop)
+        stats["blocked"] += time.perf_counter() - start
+
+    # pass on the items a stage still holds, e.g. a partial library batch
+    if flush is not None and not stop.is_set():
+        start = time.perf_counter()
+        try:
+            for result in flush():
+                outbox.put(result)
+        except Exception as error:
+            errors.append((name, None, error))
+            stop.set()
+        stats["busy"] += time.perf_counter() - start
+    try:
+        outbox.put(_DONE, block=not stop.is_set())
+    except queue.Full:
+        # the next stage has been stopped as well
+        pass
+
+
+def run_pipelined(
+    items,
+    library,
+    previews=None,
+    batch_size=16,
+    packed=False,
+    workers=1,
+    render_processes=2,
+    queue_size=2,
+    metrics=None,
+    log=print,
+):
+    """
+    ------------------------------------------------
+    A function that runs the full pipeline for the items of a manifest with overlapping
+    stages: while an item is generated on the GPU, the previous one is synthesized on the
+    CPU and the one before that is rendered and saved by blender. Generation and synthesis
+    are threads, blender runs on the calling thread (bpy.ops crash on other threads) and
+    hands the previews to a pool of render processes. The stages are connected by bounded
+    queues, so a slow stage holds back the faster ones instead of piling up textures in
+    memory.
+
+    Args:
+    ------------------------------------------------
+    items, library, previews, batch_size, packed, workers, log: See run.
+    render_processes: An integer representing the number of blender processes rendering
+        the previews, 0 renders them on the calling thread.
+    queue_size: An integer representing the number of items that can wait between stages.
+    metrics: An optional dictionary, filled with the statistics of every stage: items,
+        busy (seconds working), starved (seconds waiting for input) and blocked (seconds
+        waiting for the next stage).
+
+    Returns:
+    ------------------------------------------------
+    A list of the finished items, in manifest order.
+    """
+    if previews is not None:
+        os.makedirs(previews, exist_ok=True)
+
+    # blender renders and saves in a single stage, bpy is used from one thread only
+    pending, finished = [], []
+    # items in manifest order with the futures of their previews
+    rendering = collections.deque()
+    pool = None
+    if previews is not None and render_processes > 0:
+        pool = renderfarm.RenderPool(render_processes)
+
+    def blender(item):
+        if pool is None:
+            if previews is not None:
+                stage_render(item, previews)
+            return add(item)
+
+        maps = item["maps"]
+        rendering.append(
+            (item, pool.submit(item["light_rotation"], item["name"], *maps))
+        )
+        # save the rendered items, waiting only if too many renders are queued
+        saved = []
+        while rendering and (
+            rendering[0][1].done() or len(rendering) > 2 * pool.processes
+        ):
+            item, future = rendering.popleft()
+            saved += add(stage_render(item, previews, future.result()))
+        return saved
+
+    def add(item):
+        pending.append(item)
+        return save() if len(pending) >= batch_size else []
+
+    def save():
+        saved = stage_save(list(pending), library, packed) if pending else []
+        pending.clear()
+        for item in saved:
+            finished.append(item)
+            log("[%d/%d] %s" % (len(finished), len(items), item["material"]))
+        return saved
+
+    def flush():
+        saved = []
+        while rendering:
+            item, future = rendering.popleft()
+            saved += add(stage_render(item, previews, future.result()))
+        return saved + save()
+
+    stages = (
+        ("generate", lambda item: [stage_generate(item)], None),
+        ("synthesize", lambda item: [stage_synthesize(item, workers)], None),
+        ("blender", blender, flush),
+    )
+
+    # the first queue holds the whole manifest, the others are bounded
+    queues = [queue.Queue()] + [queue.Queue(queue_size) for _ in stages[1:]]
+    queues.append(queue.Queue())
+    for item in items:
+        queues[0].put(item)
+    queues[0].put(_DONE)
+
+    metrics = {} if metrics is None else metrics
+    stop, errors = threading.Event(), []
+    runs = []
+    for i, (name, func, stage_flush) in enumerate(stages):
+        metrics[name] = {"items": 0, "busy": 0.0, "starved": 0.0, "blocked": 0.0}
+        args = (name, func, queues[i], queues[i + 1], metrics, stop, errors)
+        runs.append((args, {"flush": stage_flush}))
+
+    # generation and synthesis run on threads, blender on the calling thread
+    threads = [
+        threading.Thread(
+            target=_stage,
+            args=args,
+            kwargs=kwargs,
+            name="ai2mat-" + args[0],
+            daemon=True,
+        )
+        for args, kwargs in runs[:-1]
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    try:
+        args, kwargs = runs[-1]
+        _stage(*args, **kwargs)
+    finally:
+        # a no-op after a normal end, the other stages stop if blender was interrupted
+        stop.set()
+        for thread in threads:
+            thread.join()
+        if pool is not None:
+            pool.shutdown()
+    seconds = time.perf_counter() - start
+
+    for name, stats in metrics.items():
+        log(
+            "%-10s  %5d items  %7.2f items/s  busy %5.1f%%  starved %7.1f s  "
+            "blocked %7.1f s"
+            % (
+                name,
+                stats["items"],
+                stats["items"] / max(stats["busy"], 1e-9),
+                100 * stats["busy"] / max(seconds, 1e-9),
+                stats["starved"],
+                stats["blocked"],
+            )
+        )
+
+    if errors:
+        name, item, error = errors[0]
+        where = "" if item is None else " (%s)" % item["name"]
+        raise RuntimeError("The %s stage failed%s" % (name, where)) from error
+    return finished
@@ -0,0 +1,239 @@
+# %%
+# pylint: disable=E1101
+import itertools
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import traceback
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+
+import numpy as np
+from PIL import Image
+
+
+# %%
+# Shared memory transfer of the maps
+def _maps_to_shared(maps):
+    # copy the maps as uint8 arrays into one shared memory block
+    arrays = [np.ascontiguousarray(np.asarray(tex), dtype=np.uint8) for tex in maps]
+    block = shared_memory.SharedMemory(
+        create=True, size=max(1, sum(arr.nbytes for arr in arrays))
+    )
+    offset = 0
+    for arr in arrays:
+        np.ndarray(arr.shape, np.uint8, block.buf, offset)[...] = arr
+        offset += arr.nbytes
+    return block, [arr.shape for arr in arrays]
+
+
+def _maps_from_shared(block, shapes):
+    # read the maps of a shared memory block as PIL images
+    maps, offset = [], 0
+    for shape in shapes:
+        arr = np.ndarray(shape, np.uint8, block.buf, offset)
+        # the images are copied, the block is released by the pool after the render
+        maps.append(Image.fromarray(arr.copy()))
+        offset += arr.nbytes
+    return maps
+
+
+# %%
+# Worker processes
+def _worker_path():
+    # the script folders that bpy adds to sys.path shadow the bpy module itself in a new
+    # process, the workers start from the path without them
+    bpy = sys.modules.get("bpy")
+    if bpy is None:
+        return list(sys.path)
+    roots = tuple(os.path.abspath(root) + os.sep for root in bpy.utils.script_paths())
+    return [path for path in sys.path if not os.path.abspath(path).startswith(roots)]
+
+
+def _worker(tasks, results, path, threads):
+    # each worker is a headless blender session with its own preview scene
+    sys.path[:] = path
+    import blenderengine
+
+    blenderengine.RENDER_THREADS = threads
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        job, block_name, shapes, light_rotation, material_name = task
+        try:
+            block = shared_memory.SharedMemory(name=block_name)
+            try:
+                maps = _maps_from_shared(block, shapes)
+            finally:
+                block.close()
+            render_np = blenderengine.render_material(
+                light_rotation, material_name, *maps, as_array=True
+            )
+            results.put((job, render_np, None))
+        except Exception:
+            results.put((job, None, traceback.format_exc()))
+
+
+class RenderPool:
+    """
+    ------------------------------------------------
+    A pool of headless blender worker processes that render material previews
+    concurrently. The maps are handed to the workers through shared memory, the renders
+    come back as futures of PIL images. The cores are split between the workers, each
+    renders with cpu_count // processes threads unless threads is given.
+
+    Usage:
+    ------------------------------------------------
+    with RenderPool(8) as pool:
+        futures = [pool.submit(50, name, *maps) for name, maps in materials]
+        previews = [future.result() for future in futures]
+    """
+
+    def __init__(self, processes=None, threads=None):
+        # bpy is not fork safe, the workers are started as fresh interpreters
+        context = multiprocessing.get_context("spawn")
+        self._tasks = context.Queue()
+        self._results = context.Queue()
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+        self._closed = False
+
+        self.processes = processes or os.cpu_count() or 1
+        self.threads = threads or max(1, (os.cpu_count() or 1) // self.processes)
+        self._workers = [
+            context.Process(
+                target=_worker,
+                args=(self._tasks, self._results, _worker_path(), self.threads),
+                daemon=True,
+            )
+            for _ in range(self.processes)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+
+    def submit(
+        self,
+        light_rotation,
+        material_name,
+        diffuse_map,
+        metalness_map,
+        roughness_map,
+        normal_map,
+        displacement_map,
+    ):
+        """
+        ------------------------------------------------
+        Queue a preview render, the arguments are those of blenderengine.render_material.
+
+        Returns:
+        ------------------------------------------------
+        A concurrent.futures.Future of a PIL image representing the rendered preview.
+        """
+        maps = (diffuse_map, metalness_map, roughness_map, normal_map, displacement_map)
+        future = Future()
+        block, shapes = _maps_to_shared(maps)
+        with self._lock:
+            if self._closed:
+                block.close()
+                block.unlink()
+                raise RuntimeError("The render pool is shut down")
+            job = next(self._counter)
+            self._jobs[job] = (future, block)
+        self._tasks.put((job, block.name, shapes, light_rotation, material_name))
+        return future
+
+    def map(self, light_rotation, materials):
+        """
+        ------------------------------------------------
+        Render the previews of many materials.
+
+        Args:
+        ------------------------------------------------
+        light_rotation: A float representing the rotation of the light.
+        materials: An iterable of (material_name, maps) tuples.
+
+        Returns:
+        ------------------------------------------------
+        A list of PIL images representing the rendered previews, in input order.
+        """
+        futures = [
+            self.submit(light_rotation, material_name, *maps)
+            for material_name, maps in materials
+        ]
+        return [future.result() for future in futures]
+
+    def _collect(self):
+        # resolve the futures with the results of the workers
+        while True:
+            try:
+                job, render_np, error = self._results.get(timeout=1)
+            except queue.Empty:
+                if self._closed and not self._jobs:
+                    return
+                # after shutdown the workers exit on their None with code 0, while the
+                # others render the last jobs
+                crashed = [
+                    worker
+                    for worker in self._workers
+                    if not worker.is_alive() and (not self._closed or worker.exitcode)
+                ]
+                if crashed or not any(worker.is_alive() for worker in self._workers):
+                    self._fail("A render worker exited unexpectedly")
+                    return
+                continue
+
+            with self._lock:
+                future, block = self._jobs.pop(job)
+            block.close()
+            block.unlink()
+            if error is None:
+                future.set_result(Image.fromarray(render_np))
+            else:
+                future.set_exception(RuntimeError(error))
+
+    def _fail(self, message):
+        # fail all pending renders, e.g. after a worker crashed
+        with self._lock:
+            self._closed = True
+            jobs, self._jobs = self._jobs, {}
+        for future, block in jobs.values():
+            block.close()
+            block.unlink()
+            future.set_exception(RuntimeError(message))
+        for worker in self._workers:
+            if worker.is_alive():
+                worker.terminate()
+
+    def shutdown(self, wait=True):
+        """
+        ------------------------------------------------
+        Stop the workers once the queued renders are done.
+
+        Args:
+        ------------------------------------------------
+        wait: A boolean, True blocks until the workers have exited.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        for _ in self._workers:
+            self._tasks.put(None)
+        if wait:
+            for worker in self._workers:
+                worker.join()
+            self._collector.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
@@ -0,0 +1,110 @@
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pytest
+
+import ai2tex
+
+
+@pytest.fixture
+def stand_ins():
+    # stand-in pipelines, restored to the default factories afterwards
+    ai2tex.register_pipeline("create", ai2tex.StandInPipeline)
+    ai2tex.register_pipeline("inpaint", ai2tex.StandInPipeline)
+    yield
+    ai2tex.register_pipeline("create", ai2tex._load_create_pipeline)
+    ai2tex.register_pipeline("inpaint", ai2tex._load_inpaint_pipeline)
+
+
+def test_import_does_not_load_models():
+    code = (
+        "import sys, ai2tex; print('torch' in sys.modules, 'diffusers' in sys.modules)"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=ai2tex.os.path.dirname(ai2tex.__file__),
+    ).stdout
+    assert out.split() == ["False", "False"]
+
+
+def test_pipeline_is_loaded_once():
+    loads = []
+    ai2tex.register_pipeline("test", lambda: loads.append(1) or object())
+    try:
+        assert ai2tex.get_pipeline("test") is ai2tex.get_pipeline("test")
+        assert len(loads) == 1
+    finally:
+        ai2tex.release_pipeline("test")
+
+
+def test_idle_pipelines_are_evicted(monkeypatch):
+    monkeypatch.setattr(ai2tex, "PIPELINE_KEEP_ALIVE", 0.05)
+    loads = []
+    ai2tex.register_pipeline("test", lambda: loads.append(1) or object())
+    try:
+        ai2tex.get_pipeline("test")
+        time.sleep(0.3)
+        # released by the timer, without another call to get_pipeline
+        assert "test" not in ai2tex.loaded_pipelines()
+    finally:
+        ai2tex.release_pipeline("test")
+
+
+def test_requested_pipeline_is_not_evicted(monkeypatch):
+    monkeypatch.setattr(ai2tex, "PIPELINE_KEEP_ALIVE", 60)
+    loads = []
+    ai2tex.register_pipeline("test", lambda: loads.append(1) or object())
+    try:
+        ai2tex.get_pipeline("test")
+        monkeypatch.setattr(ai2tex, "PIPELINE_KEEP_ALIVE", 0)
+        ai2tex.get_pipeline("test")
+        assert len(loads) == 1
+    finally:
+        ai2tex.release_pipeline("test")
+
+
+def test_seed_reproduces_texture(stand_ins):
+    a = ai2tex.tex_create("wood", 64, 5, seed=3)
+    b = ai2tex.tex_create("wood", 64, 5, seed=3)
+    c = ai2tex.tex_create("wood", 64, 5, seed=4)
+    assert np.array_equal(np.asarray(a), np.asarray(b))
+    assert not np.array_equal(np.asarray(a), np.asarray(c))
+
+
+def test_batch_seeds_match_single_textures(stand_ins):
+    batch = ai2tex.tex_create_batch(["wood"], 64, 5, num_images_per_prompt=2, seed=3)
+    single = ai2tex.tex_create("wood", 64, 5, seed=4)
+    assert np.array_equal(np.asarray(batch[1]), np.asarray(single))
+
+
+@pytest.mark.parametrize("size", [512, 100, 300])
+@pytest.mark.parametrize("single_pass", [True, False])
+def test_seamless_keeps_size(stand_ins, size, single_pass):
+    tex = ai2tex.tex_create("wood", size, 5, seed=1)
+    seamless = ai2tex.tex_seamless("wood", tex, 16, 5, single_pass=single_pass)
+    assert seamless.size == (size, size)
+
+
+@pytest.mark.parametrize("size", [96, 100])
+def test_seamless_mask_keeps_the_center_in_one_piece(size):
+    mask = ai2tex.mask_array("seamless", size, size, 16)
+    center = ai2tex.tex_shift(
+        ai2tex.mask_array("center", size, size, 16), fraction=0.25
+    )
+    # the center square lies inside the texture shifted by a quarter, away from its edges
+    rows, cols = np.nonzero(center)
+    assert rows.min() > 0 and rows.max() < size - 1
+    assert cols.min() > 0 and cols.max() < size - 1
+    assert (mask >= center).all()
+
+    # shifted back, the mask covers the seam cross on the borders and the center square
+    seam = ai2tex.tex_shift(ai2tex.mask_array("seam", size, size, 16), inverse=True)
+    back = ai2tex.tex_shift(mask, inverse=True, fraction=0.25)
+    assert np.array_equal(
+        back, np.maximum(seam, ai2tex.mask_array("center", size, size, 16))
+    )
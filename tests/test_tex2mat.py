@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+import tex2mat
+
+SETTINGS = (100, False, 100, False, 100, False, 33, 100)
+
+
+@pytest.fixture
+def tex():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, (96, 80, 3), dtype=np.uint8)
+
+
+def assert_same(maps, expected):
+    for name in tex2mat.MAPS:
+        assert np.array_equal(np.asarray(maps[name]), expected[name]), name
+
+
+@pytest.mark.parametrize("wrap", [False, True])
+@pytest.mark.parametrize("tile_size", [16, 40, 96])
+def test_tiled_is_bit_identical(tex, wrap, tile_size):
+    expected = tex2mat.tex_to_maps(tex, *SETTINGS, wrap=wrap)
+    out = tex2mat.empty_maps(*tex.shape[:2])
+    maps = tex2mat.tex_to_maps_tiled(
+        tex, *SETTINGS, out=out, wrap=wrap, tile_size=tile_size
+    )
+    assert_same(maps, expected)
+
+
+def test_tiled_textures_match(tex):
+    image = tex2mat.Image.fromarray(tex)
+    expected = tex2mat.tex_to_mat(image, *SETTINGS, 8)
+    tiled = tex2mat.tex_to_mat(image, *SETTINGS, 8, tile_size=16)
+    for a, b in zip(expected, tiled):
+        assert np.array_equal(np.asarray(a), np.asarray(b))
+
+
+@pytest.mark.parametrize("wrap", [False, True])
+def test_workers_are_bit_identical(tex, wrap):
+    expected = tex2mat.tex_to_maps(tex, *SETTINGS, wrap=wrap)
+    assert_same(tex2mat.tex_to_maps(tex, *SETTINGS, wrap=wrap, workers=3), expected)
+
+
+@pytest.mark.parametrize("wrap", [False, True])
+def test_graph_matches_tex_to_maps(tex, wrap):
+    graph = tex2mat.MaterialGraph(wrap=wrap)
+    graph.set_texture(tex)
+    assert_same(
+        graph.tex_to_maps(*SETTINGS), tex2mat.tex_to_maps(tex, *SETTINGS, wrap=wrap)
+    )
+
+    # a slider change only recomputes the dependent nodes, with the same result
+    changed = SETTINGS[:6] + (80,) + SETTINGS[7:]
+    maps = graph.tex_to_maps(*changed)
+    assert graph.recomputed == ["normal", "magnitude", "rough", "metal"]
+    assert_same(maps, tex2mat.tex_to_maps(tex, *changed, wrap=wrap))
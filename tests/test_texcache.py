@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+import ai2tex
+import texcache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(texcache, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(texcache, "_cache_state", {"dir": None, "bytes": 0})
+    ai2tex.register_pipeline("create", ai2tex.StandInPipeline)
+    ai2tex.register_pipeline("inpaint", ai2tex.StandInPipeline)
+    yield tmp_path
+    ai2tex.register_pipeline("create", ai2tex._load_create_pipeline)
+    ai2tex.register_pipeline("inpaint", ai2tex._load_inpaint_pipeline)
+
+
+def noise(seed, size=32):
+    rng = np.random.default_rng(seed)
+    return Image.fromarray(rng.integers(0, 256, (size, size, 3), dtype=np.uint8))
+
+
+def test_seeded_textures_are_cached(cache, monkeypatch):
+    tex = texcache.tex_create("wood", 64, 5, 3)
+    # a hit does not run the pipeline again
+    monkeypatch.setattr(ai2tex, "tex_create", None)
+    assert np.array_equal(np.asarray(texcache.tex_create("wood", 64, 5, 3)), tex)
+
+
+def test_seamless_is_keyed_by_the_texture(cache):
+    a = texcache.tex_seamless("wood", noise(0), 8, 5, 3)
+    b = texcache.tex_seamless("wood", noise(1), 8, 5, 3)
+    assert not np.array_equal(np.asarray(a), np.asarray(b))
+    assert len(texcache._files()) == 2
+
+
+def test_put_again_is_counted_once(cache):
+    key = texcache.cache_key(name="a")
+    texcache.cache_put(key, noise(0))
+    size = texcache._cache_state["bytes"]
+    texcache.cache_put(key, noise(0))
+    assert texcache._cache_state["bytes"] == size
+
+
+def test_eviction_trims_to_the_low_watermark(cache, monkeypatch):
+    for i in range(4):
+        texcache.cache_put(texcache.cache_key(i=i), noise(i))
+    size = texcache._cache_state["bytes"] // 4
+    monkeypatch.setattr(texcache, "CACHE_SIZE", 4 * size)
+    monkeypatch.setattr(texcache, "CACHE_LOW_WATERMARK", 0.5)
+
+    # the least recently used texture is the first one that was not read again
+    texcache.cache_get(texcache.cache_key(i=0))
+    texcache.cache_put(texcache.cache_key(i=4), noise(4))
+    assert texcache._cache_state["bytes"] <= 2 * size
+    assert texcache.cache_get(texcache.cache_key(i=4)) is not None
+    assert texcache.cache_get(texcache.cache_key(i=1)) is None
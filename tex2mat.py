@@ -1,5 +1,10 @@
 # %%
 # pylint: disable=E1101
+import math
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 from PIL import Image
 import cv2
@@ -194,9 +199,7 @@ def metallic_map(diffuse_map, roughness_map, normal_map, invert, strength):
     # compute the metallic value
     # the less saturated the reflected light of a surface is, the more metallic it is
     metalness = v * (1 - s)
-    metal = (
-        metalness * 0.8 + 0.1 * roughness + 0.1 * np.sqrt(nx**2 + ny**2 + nz**2)
-    )
+    metal = metalness * 0.8 + 0.1 * roughness + 0.1 * np.sqrt(nx**2 + ny**2 + nz**2)
 
     if invert:
         metal = 1 - metal
@@ -206,6 +209,470 @@ def metallic_map(diffuse_map, roughness_map, normal_map, invert, strength):
     return metal
 
 
+# %%
+# Fused synthesis engine
+# All maps are computed in float32 from shared intermediates: one grayscale of the texture
+# (used by depth and diffuse), one gradient pair of the depth map and one magnitude of the
+# normal map (used by roughness and metalness). The global normalizations of the separate
+# functions above are folded into the per-pixel formulas below.
+MAPS = ("depth", "normal", "disp", "diff", "rough", "metal")
+
+
+def empty_maps(height, width):
+    """
+    ------------------------------------------------
+    A function that allocates the output buffers of the fused synthesis engine.
+
+    Args:
+    ------------------------------------------------
+    height: An integer representing the height of the texture.
+    width: An integer representing the width of the texture.
+
+    Returns:
+    ------------------------------------------------
+    A dictionary of float32 numpy arrays, keyed by the names in MAPS.
+    """
+    maps = {}
+    for name in MAPS:
+        shape = (height, width, 3) if name in ("normal", "diff") else (height, width)
+        maps[name] = np.empty(shape, np.float32)
+    return maps
+
+
+def _as_float(tex):
+    # float32 texture in the range 0-1
+    tex = np.asarray(tex)
+    if tex.dtype == np.uint8:
+        return np.multiply(tex, np.float32(1 / 255), dtype=np.float32)
+    return tex.astype(np.float32, copy=False)
+
+
+def _reduce(arr):
+    # minimum, maximum and float64 row sums of a band of rows, combinable across bands
+    sums = arr.sum(axis=tuple(range(1, arr.ndim)), dtype=np.float64)
+    return float(arr.min()), float(arr.max()), sums, arr[0].size
+
+
+def _merge(parts):
+    # minimum, maximum and mean of several bands, the exactly rounded fsum makes the
+    # mean independent of how the rows were split into bands
+    sums = np.concatenate([part[2] for part in parts])
+    mean = math.fsum(sums) / (sums.size * parts[0][3])
+    return min(part[0] for part in parts), max(part[1] for part in parts), mean
+
+
+def _stats(arr):
+    # minimum, maximum and mean used by the global normalizations
+    return _merge([_reduce(arr)])
+
+
+def _gray(tex):
+    return cv2.cvtColor(tex, cv2.COLOR_RGB2GRAY)
+
+
+def _laplacian(gray):
+    return cv2.Laplacian(gray, cv2.CV_32F, ksize=3)
+
+
+def _depth(lap, invert, lo, hi, out=None):
+    # min-max normalization of the laplacian, inverted depth maps the maximum to 0
+    scale = 1 / (hi - lo) if hi > lo else 0.0
+    if invert:
+        return np.multiply(np.subtract(hi, lap, out=out), np.float32(scale), out=out)
+    return np.multiply(np.subtract(lap, lo, out=out), np.float32(scale), out=out)
+
+
+def _normal_unit(depth, strength, out=None):
+    # unit surface normals from the scaled depth gradient
+    strength = np.float32(np.exp(strength / 10) / np.exp(5))
+    normal = np.empty(depth.shape + (3,), np.float32) if out is None else out
+    dx = cv2.Scharr(depth, cv2.CV_32F, 1, 0)
+    dy = cv2.Scharr(depth, cv2.CV_32F, 0, 1)
+    np.multiply(dx, -strength, out=normal[:, :, 0])
+    np.multiply(dy, -strength, out=normal[:, :, 1])
+
+    # reuse the gradient buffers for the inverse length of the normal vectors
+    np.square(normal[:, :, 0], out=dx)
+    np.square(normal[:, :, 1], out=dy)
+    dx += dy
+    dx += 1
+    np.sqrt(dx, out=dx)
+    np.divide(1, dx, out=dx)
+
+    np.multiply(normal[:, :, 0], dx, out=normal[:, :, 0])
+    np.multiply(normal[:, :, 1], dx, out=normal[:, :, 1])
+    normal[:, :, 2] = dx
+    return normal
+
+
+def _normal_finish(normal, lo, hi, mean):
+    # scale to 0-1, center the mean to 0.5 and clip, in place
+    scale = 1 / (hi - lo) if hi > lo else 0.0
+    normal *= np.float32(scale)
+    normal += np.float32(0.5 - mean * scale)
+    return np.clip(normal, 0, 1, out=normal)
+
+
+def _magnitude(normal, out=None):
+    out = np.einsum("ijk,ijk->ij", normal, normal, out=out)
+    return np.sqrt(out, out=out)
+
+
+def _blur(depth, out=None):
+    return cv2.GaussianBlur(depth, (7, 7), 0, dst=out)
+
+
+def _disp_finish(blur, strength, lo, hi, mean):
+    # range_midpoint followed by centering the mean to 0.5, in place
+    scale = (strength + 1) / 100 / (hi - lo) if hi > lo else 0.0
+    blur -= np.float32(mean)
+    blur *= np.float32(scale)
+    blur += np.float32(0.5)
+    return np.clip(blur, 0, 1, out=blur)
+
+
+def _diffuse(tex, gray, strength, out=None):
+    # soft light with the inverted grayscale, blended by strength:
+    # tex * (s * (2 * gray - 1) * tex + s * (2 - 2 * gray) + 1 - s)
+    s = np.float32(strength / 100)
+    a = np.multiply(gray, 2 * s)
+    b = np.multiply(a, -1)
+    a -= s
+    b += 1 + s
+    out = np.multiply(tex, a[:, :, None], out=out)
+    out += b[:, :, None]
+    return np.multiply(out, tex, out=out)
+
+
+def _rough_base(diff, out=None):
+    # edge preserving smoothing of the diffuse grayscale
+    gray = cv2.cvtColor(diff, cv2.COLOR_RGB2GRAY)
+    return cv2.bilateralFilter(gray, 7, 50, 25, dst=out)
+
+
+def _rough(base, magnitude, invert, strength, out=None):
+    out = np.multiply(base, np.float32(0.9), out=out)
+    out += np.float32(0.1) * magnitude
+    if invert:
+        np.subtract(1, out, out=out)
+
+    # range_lowerlimit
+    s = np.float32(strength / 100)
+    out *= s
+    out += 1 - s
+    return out
+
+
+def _metal_base(diff, out=None):
+    # the less saturated the reflected light of a surface is, the more metallic it is
+    hsv = cv2.cvtColor(diff, cv2.COLOR_RGB2HSV)
+    out = np.subtract(1, hsv[:, :, 1], out=out)
+    out *= hsv[:, :, 2]
+    return out
+
+
+def _metal(base, rough, magnitude, invert, strength, out=None):
+    out = np.multiply(base, np.float32(0.8), out=out)
+    out += np.float32(0.1 / 255) * rough
+    out += np.float32(0.1) * magnitude
+    if invert:
+        np.subtract(1, out, out=out)
+
+    # range_upperlimit
+    out *= np.float32(strength / 100)
+    return out
+
+
+# rows and columns of context a pixel needs: laplacian (1) and scharr (1) for the normals,
+# laplacian (1) and the 7x7 gaussian (3) for the displacement, the bilateral filter (3)
+HALO = 4
+
+
+def _synthesize(tex, settings, out, core=None, stats=None):
+    # compute all maps of a block of the texture and write its core into out,
+    # the global statistics are taken from the core unless they are given
+    (
+        diffuse_strength,
+        invert_metalness,
+        metallness_strength,
+        invert_roughness,
+        roughness_strength,
+        invert_depth,
+        normal_strength,
+        displacement_strength,
+    ) = settings
+
+    # without a halo the maps are written straight into the output buffers
+    target = out if core is None else dict.fromkeys(MAPS)
+    core = core or (slice(None), slice(None))
+
+    gray = _gray(tex)
+    lap = _laplacian(gray)
+    lo, hi, _ = stats["lap"] if stats else _stats(lap[core])
+    depth = _depth(lap, invert_depth, lo, hi, out=target["depth"])
+
+    normal = _normal_unit(depth, normal_strength, out=target["normal"])
+    _normal_finish(normal, *(stats["normal"] if stats else _stats(normal[core])))
+    magnitude = _magnitude(normal, out=lap)
+
+    disp = _blur(depth, out=target["disp"])
+    _disp_finish(
+        disp, displacement_strength, *(stats["disp"] if stats else _stats(disp[core]))
+    )
+
+    diff = _diffuse(tex, gray, diffuse_strength, out=target["diff"])
+    rough = _rough_base(diff, out=target["rough"])
+    rough = _rough(rough, magnitude, invert_roughness, roughness_strength, rough)
+    metal = _metal_base(diff, out=target["metal"])
+    metal = _metal(
+        metal, rough, magnitude, invert_metalness, metallness_strength, metal
+    )
+
+    if target is not out:
+        for name, arr in zip(MAPS, (depth, normal, disp, diff, rough, metal)):
+            out[name][...] = arr[core]
+    return out
+
+
+def tex_to_maps(
+    tex,
+    diffuse_strength,
+    invert_metalness,
+    metallness_strength,
+    invert_roughness,
+    roughness_strength,
+    invert_depth,
+    normal_strength,
+    displacement_strength,
+    out=None,
+    wrap=False,
+    workers=1,
+):
+    """
+    ------------------------------------------------
+    A function that computes all material maps of a texture in one fused pass.
+
+    Args:
+    ------------------------------------------------
+    tex: A numpy array (uint8 or float32 in the range 0-1) representing the RGB texture.
+    The strengths and inverts are the slider settings of tex_to_mat.
+    out: An optional dictionary of preallocated buffers from empty_maps.
+    wrap: A boolean, True filters across the borders as if the texture was tiled.
+    workers: An integer, more than 1 splits the texture into bands which are synthesized
+        concurrently by tex_to_maps_tiled (with an identical result).
+
+    Returns:
+    ------------------------------------------------
+    A dictionary of float32 numpy arrays, keyed by the names in MAPS.
+    """
+    settings = (
+        diffuse_strength,
+        invert_metalness,
+        metallness_strength,
+        invert_roughness,
+        roughness_strength,
+        invert_depth,
+        normal_strength,
+        displacement_strength,
+    )
+    height, width = tex.shape[:2]
+    maps = out if out is not None else empty_maps(height, width)
+
+    if workers > 1:
+        # a few bands per worker to even out the load, but not much thinner than the halo
+        tile_size = max(8 * HALO, -(-height // (4 * workers)))
+        return tex_to_maps_tiled(
+            tex, *settings, out=maps, wrap=wrap, tile_size=tile_size, workers=workers
+        )
+
+    tex = _as_float(tex)
+    if not wrap:
+        return _synthesize(tex, settings, maps)
+
+    tex = np.pad(tex, ((HALO, HALO), (HALO, HALO), (0, 0)), mode="wrap")
+    core = (slice(HALO, HALO + height), slice(HALO, HALO + width))
+    return _synthesize(tex, settings, maps, core)
+
+
+def memmap_maps(directory, height, width):
+    """
+    ------------------------------------------------
+    A function that creates memory-mapped output buffers (one .npy file per map).
+
+    Args:
+    ------------------------------------------------
+    directory: A string representing the directory of the files, None maps anonymous
+        temporary files which are deleted with the memmaps.
+    height: An integer representing the height of the texture.
+    width: An integer representing the width of the texture.
+
+    Returns:
+    ------------------------------------------------
+    A dictionary of float32 numpy memmaps, keyed by the names in MAPS.
+    """
+    if directory is not None:
+        os.makedirs(directory, exist_ok=True)
+    maps = {}
+    for name in MAPS:
+        shape = (height, width, 3) if name in ("normal", "diff") else (height, width)
+        if directory is None:
+            # the mapping outlives the file object, the file is gone once it is unmapped
+            with tempfile.TemporaryFile(prefix="ai2mat_") as file:
+                maps[name] = np.memmap(file, np.float32, "w+", shape=shape)
+            continue
+        maps[name] = np.lib.format.open_memmap(
+            os.path.join(directory, name + ".npy"), "w+", np.float32, shape
+        )
+    return maps
+
+
+def _bands(height, tile_size):
+    return [(y, min(y + tile_size, height)) for y in range(0, height, tile_size)]
+
+
+def _band(tex, y0, y1, wrap):
+    # rows y0-y1 of the texture with their halo, as float block and core slices
+    height, width = tex.shape[:2]
+    if wrap:
+        rows = np.arange(y0 - HALO, y1 + HALO) % height
+        block = np.pad(_as_float(tex[rows]), ((0, 0), (HALO, HALO), (0, 0)), "wrap")
+        return block, (slice(HALO, HALO + y1 - y0), slice(HALO, HALO + width))
+
+    top, bottom = max(y0 - HALO, 0), min(y1 + HALO, height)
+    block = _as_float(tex[top:bottom])
+    return block, (slice(y0 - top, y1 - top), slice(None))
+
+
+def _band_lap_stats(tex, y0, y1, wrap):
+    block, core = _band(tex, y0, y1, wrap)
+    return _reduce(_laplacian(_gray(block))[core])
+
+
+def _band_depth_stats(tex, y0, y1, wrap, invert_depth, normal_strength, lap):
+    block, core = _band(tex, y0, y1, wrap)
+    depth = _depth(_laplacian(_gray(block)), invert_depth, *lap)
+    normal = _normal_unit(depth, normal_strength)
+    return _reduce(normal[core]), _reduce(_blur(depth)[core])
+
+
+def _band_maps(tex, y0, y1, wrap, settings, stats, out):
+    block, core = _band(tex, y0, y1, wrap)
+    band = {name: arr[y0:y1] for name, arr in out.items()}
+    _synthesize(block, settings, band, core, stats)
+
+
+def tex_to_maps_tiled(
+    tex,
+    diffuse_strength,
+    invert_metalness,
+    metallness_strength,
+    invert_roughness,
+    roughness_strength,
+    invert_depth,
+    normal_strength,
+    displacement_strength,
+    out=None,
+    wrap=False,
+    tile_size=512,
+    workers=1,
+):
+    """
+    ------------------------------------------------
+    A function that computes the same maps as tex_to_maps, bit for bit, while only holding
+    one band of tile_size rows (plus a halo of HALO rows) in memory at a time.
+    The texture is walked three times: for the laplacian range, for the normal and
+    displacement statistics and finally for the maps themselves.
+
+    Args:
+    ------------------------------------------------
+    tex: A numpy array or memmap (uint8 or float32 in the range 0-1) representing the RGB texture.
+    The strengths and inverts are the slider settings of tex_to_mat.
+    out: An optional dictionary of output buffers, defaults to memmaps of temporary files.
+    wrap: A boolean, True filters across the borders as if the texture was tiled.
+    tile_size: An integer representing the number of rows per band.
+    workers: An integer representing the number of threads processing bands concurrently,
+        OpenCV and NumPy release the GIL so the bands run in parallel.
+
+    Returns:
+    ------------------------------------------------
+    A dictionary of float32 numpy arrays or memmaps, keyed by the names in MAPS.
+    """
+    settings = (
+        diffuse_strength,
+        invert_metalness,
+        metallness_strength,
+        invert_roughness,
+        roughness_strength,
+        invert_depth,
+        normal_strength,
+        displacement_strength,
+    )
+    height, width = tex.shape[:2]
+    if out is None:
+        out = memmap_maps(None, height, width)
+    bands = _bands(height, tile_size)
+
+    with ThreadPoolExecutor(max(workers, 1)) as pool:
+
+        def each_band(func, *args):
+            # results in band order, the merged statistics do not depend on it anyway
+            if workers <= 1:
+                return [func(tex, y0, y1, wrap, *args) for y0, y1 in bands]
+            futures = [pool.submit(func, tex, y0, y1, wrap, *args) for y0, y1 in bands]
+            return [future.result() for future in futures]
+
+        lap = _merge(each_band(_band_lap_stats))[:2]
+        parts = each_band(_band_depth_stats, invert_depth, normal_strength, lap)
+        stats = {
+            "lap": lap + (None,),
+            "normal": _merge([part[0] for part in parts]),
+            "disp": _merge([part[1] for part in parts]),
+        }
+        each_band(_band_maps, settings, stats, out)
+    return out
+
+
+# rows per band when the float maps are quantized to 8 bit images
+QUANTIZE_ROWS = 256
+
+
+def maps_to_textures(tex, maps, bit_depth):
+    """
+    ------------------------------------------------
+    A function that converts the float maps of tex_to_maps to the PIL images of tex_to_mat.
+
+    Args:
+    ------------------------------------------------
+    tex: A PIL image representing the texture.
+    maps: A dictionary of float32 numpy arrays, keyed by the names in MAPS.
+    bit_depth: An integer representing the bit depth of the diffuse map.
+
+    Returns:
+    ------------------------------------------------
+    A tuple of PIL images (raw, depth, diff, metal, rough, normal, disp).
+    """
+    shift = 8 - bit_depth
+
+    def image(arr, shift=0):
+        # quantize band by band, the float temporaries stay small for large (memmap) maps
+        out = np.empty(arr.shape, np.uint8)
+        for y in range(0, arr.shape[0], QUANTIZE_ROWS):
+            band = (arr[y : y + QUANTIZE_ROWS] * 255).astype(np.uint8)
+            out[y : y + QUANTIZE_ROWS] = band >> shift << shift
+        return Image.fromarray(out)
+
+    raw = Image.fromarray(np.asarray(tex_to_arr(tex), dtype=np.uint8))
+    return (
+        raw,
+        image(maps["depth"]),
+        image(maps["diff"], shift),
+        image(maps["metal"]),
+        image(maps["rough"]),
+        image(maps["normal"]),
+        image(maps["disp"]),
+    )
+
+
 def tex_to_mat(
     tex,
     diffuse_strength,
@@ -217,29 +684,202 @@ def tex_to_mat(
     normal_strength,
     displacement_strength,
     bit_depth,
+    wrap=False,
+    tile_size=None,
+    workers=1,
 ):
-    displacement_strength = displacement_strength + 1
-    tex = (tex_to_arr(tex) / 255).astype(np.float32)
-
-    raw = tex
-    depth = tex_to_depth(tex, invert_depth)
-    normal = depth_to_norm(depth, normal_strength)
-    disp = depth_to_disp(depth, displacement_strength)
-    diff = tex_to_diff(tex, diffuse_strength)
-    rough = tex_to_rough(diff, normal, invert_roughness, roughness_strength)
-    metal = metallic_map(diff, rough, normal, invert_metalness, metallness_strength)
-
-    # convert the maps to the specified bit depth
-    diff = ((255 * diff).astype(np.uint8) >> (8 - bit_depth) << (8 - bit_depth)) / 255
-
-    # ugly type conversion to please PIL in not fucking up the ranges
-    raw = Image.fromarray((raw * 255).astype(np.uint8))
-    depth = Image.fromarray((depth * 255).astype(np.uint8))
-    diff = Image.fromarray((diff * 255).astype(np.uint8))
-    metal = Image.fromarray((metal * 255).astype(np.uint8))
-    rough = Image.fromarray((rough * 255).astype(np.uint8))
-    normal = Image.fromarray((normal * 255).astype(np.uint8))
-    disp = Image.fromarray((disp * 255).astype(np.uint8))
-
-    return raw, depth, diff, metal, rough, normal, disp
+    settings = (
+        diffuse_strength,
+        invert_metalness,
+        metallness_strength,
+        invert_roughness,
+        roughness_strength,
+        invert_depth,
+        normal_strength,
+        displacement_strength,
+    )
+
+    if tile_size is None:
+        maps = tex_to_maps(tex_to_arr(tex), *settings, wrap=wrap, workers=workers)
+        return maps_to_textures(tex, maps, bit_depth)
+
+    # large textures are processed in bands of tile_size rows into temporary memmaps
+    arr = tex_to_arr(tex)
+    maps = tex_to_maps_tiled(
+        arr, *settings, wrap=wrap, tile_size=tile_size, workers=workers
+    )
+    return maps_to_textures(tex, maps, bit_depth)
+
+
+# %%
+# Incremental synthesis
+class MaterialGraph:
+    """
+    ------------------------------------------------
+    A dependency graph over the intermediates of the fused synthesis engine. Every node is
+    memoized under the versions of its inputs and the slider settings it reads, so after a
+    slider change only the invalidated part of the graph is recomputed (e.g. the normal
+    strength recomputes normal, roughness and metalness, but not depth or diffuse).
+    The results are identical to tex_to_maps.
+    """
+
+    SETTINGS = (
+        "diffuse_strength",
+        "invert_metalness",
+        "metallness_strength",
+        "invert_roughness",
+        "roughness_strength",
+        "invert_depth",
+        "normal_strength",
+        "displacement_strength",
+    )
+
+    # node: (nodes it depends on, settings it reads)
+    NODES = {
+        "gray": (("tex",), ()),
+        "lap": (("gray",), ()),
+        "depth": (("lap",), ("invert_depth",)),
+        "normal": (("depth",), ("normal_strength",)),
+        "magnitude": (("normal",), ()),
+        "blur": (("depth",), ()),
+        "disp": (("blur",), ("displacement_strength",)),
+        "diff": (("tex", "gray"), ("diffuse_strength",)),
+        "rough_base": (("diff",), ()),
+        "rough": (
+            ("rough_base", "magnitude"),
+            ("invert_roughness", "roughness_strength"),
+        ),
+        "metal_base": (("diff",), ()),
+        "metal": (
+            ("metal_base", "rough", "magnitude"),
+            ("invert_metalness", "metallness_strength"),
+        ),
+    }
+
+    def __init__(self, wrap=False):
+        self.wrap = wrap
+        self.image = None
+        self.recomputed = []
+        self._values = {}
+        self._keys = {}
+        self._versions = {}
+        self._settings = {}
+        self._core = (slice(None), slice(None))
+
+    def set_texture(self, tex):
+        """
+        ------------------------------------------------
+        Sets the texture, invalidating the whole graph if it is a new one.
+
+        Args:
+        ------------------------------------------------
+        tex: A PIL image or numpy array representing the RGB texture.
+        """
+        if tex is self.image:
+            return
+        self.image = tex
+
+        arr = _as_float(tex_to_arr(tex))
+        height, width = arr.shape[:2]
+        self._core = (slice(None), slice(None))
+        if self.wrap:
+            arr = np.pad(arr, ((HALO, HALO), (HALO, HALO), (0, 0)), mode="wrap")
+            self._core = (slice(HALO, HALO + height), slice(HALO, HALO + width))
+
+        self._values["tex"] = arr
+        self._versions["tex"] = self._versions.get("tex", 0) + 1
+
+    def tex_to_maps(self, *settings):
+        """
+        ------------------------------------------------
+        Computes the maps for the given slider settings, reusing all unaffected intermediates.
+
+        Args:
+        ------------------------------------------------
+        The strengths and inverts of tex_to_maps, in the same order.
+
+        Returns:
+        ------------------------------------------------
+        A dictionary of float32 numpy arrays, keyed by the names in MAPS. The arrays are
+        owned by the graph and must not be modified.
+        """
+        if self.image is None:
+            raise ValueError("No texture set")
+        self._settings = dict(zip(self.SETTINGS, settings))
+        self.recomputed = []
+        return {name: self._get(name)[self._core] for name in MAPS}
+
+    def tex_to_mat(self, *settings):
+        """
+        ------------------------------------------------
+        The incremental counterpart of tex_to_mat.
+
+        Args:
+        ------------------------------------------------
+        The strengths and inverts of tex_to_mat followed by the bit depth.
+
+        Returns:
+        ------------------------------------------------
+        A tuple of PIL images (raw, depth, diff, metal, rough, normal, disp).
+        """
+        maps = self.tex_to_maps(*settings[:-1])
+        return maps_to_textures(self.image, maps, settings[-1])
+
+    def _get(self, name):
+        if name == "tex":
+            return self._values["tex"]
+
+        deps, settings = self.NODES[name]
+        args = [self._get(dep) for dep in deps]
+        key = tuple(self._versions[dep] for dep in deps)
+        key += tuple(self._settings[setting] for setting in settings)
+
+        if self._keys.get(name) != key:
+            values = [self._settings[setting] for setting in settings]
+            self._values[name] = getattr(self, "_" + name)(*args, *values)
+            self._keys[name] = key
+            self._versions[name] = self._versions.get(name, 0) + 1
+            self.recomputed.append(name)
+        return self._values[name]
+
+    def _gray(self, tex):
+        return _gray(tex)
+
+    def _lap(self, gray):
+        return _laplacian(gray)
+
+    def _depth(self, lap, invert_depth):
+        lo, hi, _ = _stats(lap[self._core])
+        return _depth(lap, invert_depth, lo, hi)
+
+    def _normal(self, depth, normal_strength):
+        normal = _normal_unit(depth, normal_strength)
+        return _normal_finish(normal, *_stats(normal[self._core]))
+
+    def _magnitude(self, normal):
+        return _magnitude(normal)
+
+    def _blur(self, depth):
+        return _blur(depth)
+
+    def _disp(self, blur, displacement_strength):
+        stats = _stats(blur[self._core])
+        return _disp_finish(blur.copy(), displacement_strength, *stats)
+
+    def _diff(self, tex, gray, diffuse_strength):
+        return _diffuse(tex, gray, diffuse_strength)
+
+    def _rough_base(self, diff):
+        return _rough_base(diff)
+
+    def _rough(self, base, magnitude, invert_roughness, roughness_strength):
+        return _rough(base, magnitude, invert_roughness, roughness_strength)
+
+    def _metal_base(self, diff):
+        return _metal_base(diff)
+
+    def _metal(self, base, rough, magnitude, invert_metalness, metallness_strength):
+        return _metal(base, rough, magnitude, invert_metalness, metallness_strength)
+
+
 # %%
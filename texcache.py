@@ -0,0 +1,245 @@
+# %%
+# pylint: disable=E1101
+import hashlib
+import json
+import os
+import threading
+import uuid
+
+import numpy as np
+from PIL import Image
+
+import ai2tex
+
+# %%
+# On-disk texture cache
+# folder of the cache, set AI2MAT_CACHE to move it
+CACHE_DIR = os.environ.get(
+    "AI2MAT_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "ai2mat")
+)
+
+# bytes the cache may hold before the least recently used textures are evicted
+CACHE_SIZE = int(os.environ.get("AI2MAT_CACHE_SIZE", 2 * 2**30))
+
+# fraction of CACHE_SIZE an eviction trims the cache to, so the next puts do not evict again
+CACHE_LOW_WATERMARK = 0.8
+
+# bytes currently in the cache, counted on first use
+_cache_state = {"dir": None, "bytes": 0}
+_cache_lock = threading.Lock()
+
+
+def cache_key(**fields):
+    """
+    ------------------------------------------------
+    A function that computes the key of a cache entry from everything that determines it.
+
+    Args:
+    ------------------------------------------------
+    fields: The json serializable settings of the entry, e.g. model, prompt and seed.
+
+    Returns:
+    ------------------------------------------------
+    A string representing the hex digest of the settings.
+    """
+    data = json.dumps(fields, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def _path(key):
+    # two levels keep the folders small
+    return os.path.join(CACHE_DIR, key[:2], key + ".png")
+
+
+def _files():
+    # all cached textures as (last use, size, path)
+    files = []
+    for root, _, names in os.walk(CACHE_DIR):
+        for name in names:
+            if name.endswith(".png"):
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+    return files
+
+
+def _count():
+    # count the cache size once per cache folder
+    if _cache_state["dir"] != CACHE_DIR:
+        _cache_state["dir"] = CACHE_DIR
+        _cache_state["bytes"] = sum(size for _, size, _ in _files())
+
+
+def cache_get(key):
+    """
+    ------------------------------------------------
+    A function that reads a texture from the cache and marks it as recently used.
+
+    Args:
+    ------------------------------------------------
+    key: A string representing the key of the entry, see cache_key.
+
+    Returns:
+    ------------------------------------------------
+    A PIL image, or None if the texture is not cached.
+    """
+    path = _path(key)
+    try:
+        with Image.open(path) as tex:
+            tex.load()
+        os.utime(path)
+    except OSError:
+        # missing, evicted meanwhile or unreadable
+        return None
+    return tex
+
+
+def cache_put(key, tex):
+    """
+    ------------------------------------------------
+    A function that writes a texture to the cache. If the cache grows beyond CACHE_SIZE,
+    the least recently used textures are evicted down to CACHE_LOW_WATERMARK.
+
+    Args:
+    ------------------------------------------------
+    key: A string representing the key of the entry, see cache_key.
+    tex: A PIL image representing the texture.
+
+    Returns:
+    ------------------------------------------------
+    None
+    """
+    path = _path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # write to a private file first, so readers never see a partial texture
+    temp = "%s.%s.tmp" % (path, uuid.uuid4().hex)
+    tex.save(temp, format="PNG")
+    size = os.path.getsize(temp)
+
+    with _cache_lock:
+        _count()
+        # a texture that is put again replaces the old file
+        try:
+            size -= os.path.getsize(path)
+        except FileNotFoundError:
+            pass
+        os.replace(temp, path)
+        _cache_state["bytes"] += size
+        if _cache_state["bytes"] > CACHE_SIZE:
+            _evict(int(CACHE_SIZE * CACHE_LOW_WATERMARK))
+
+
+def cache_evict(max_bytes=0):
+    """
+    ------------------------------------------------
+    A function that removes the least recently used textures until the cache holds at
+    most max_bytes.
+
+    Args:
+    ------------------------------------------------
+    max_bytes: An integer, 0 clears the cache.
+
+    Returns:
+    ------------------------------------------------
+    An integer representing the number of removed textures.
+    """
+    with _cache_lock:
+        return _evict(max_bytes)
+
+
+def _evict(max_bytes):
+    # remove the textures used longest ago, the caller holds the cache lock
+    files = sorted(_files())
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    for _, size, path in files:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    _cache_state["dir"] = CACHE_DIR
+    _cache_state["bytes"] = total
+    return removed
+
+
+# %%
+# Cached texture creation
+def tex_create(prompt, size, num_inference_steps, seed, tileable=False):
+    """
+    ------------------------------------------------
+    ai2tex.tex_create through the cache. Textures without a seed are random and are
+    created without the cache.
+
+    Returns:
+    ------------------------------------------------
+    A PIL image representing the created texture.
+    """
+    if seed is None:
+        return ai2tex.tex_create(prompt, size, num_inference_steps, tileable=tileable)
+
+    key = cache_key(
+        stage="create",
+        model=ai2tex.pipeline_model("create"),
+        prompt=prompt,
+        seed=seed,
+        size=size,
+        steps=num_inference_steps,
+        tileable=tileable,
+    )
+    tex = cache_get(key)
+    if tex is None:
+        tex = ai2tex.tex_create(
+            prompt, size, num_inference_steps, tileable=tileable, seed=seed
+        )
+        cache_put(key, tex)
+    return tex
+
+
+def tex_seamless(prompt, tex, seam_width, num_inference_steps, seed, single_pass=True):
+    """
+    ------------------------------------------------
+    ai2tex.tex_seamless through the cache, keyed by the content of the input texture.
+    Textures without a seed are inpainted without the cache.
+
+    Returns:
+    ------------------------------------------------
+    A PIL image representing the seamless texture.
+    """
+    if seed is None:
+        return ai2tex.tex_seamless(
+            prompt, tex, seam_width, num_inference_steps, single_pass=single_pass
+        )
+
+    arr = np.ascontiguousarray(np.asarray(tex.convert("RGB")))
+    key = cache_key(
+        stage="seamless",
+        model=ai2tex.pipeline_model("inpaint"),
+        prompt=prompt,
+        seed=seed,
+        texture=hashlib.sha256(arr).hexdigest(),
+        shape=arr.shape,
+        seam_width=seam_width,
+        steps=num_inference_steps,
+        single_pass=single_pass,
+        # textures of the single pass with the center split into the corners are not reused
+        version=2,
+    )
+    seamless = cache_get(key)
+    if seamless is None:
+        seamless = ai2tex.tex_seamless(
+            prompt,
+            tex,
+            seam_width,
+            num_inference_steps,
+            single_pass=single_pass,
+            seed=seed,
+        )
+        cache_put(key, seamless)
+    return seamless